@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Benchmark transcript.parse_lines against the original uncompiled parser, and reading
+# a txt file with open() against the mmap from open_transcript
+# usage: bench_parse.py [students] [repeats]
+
+import os, sys
+import re
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from config import *
+from transcript import parse_lines, open_transcript
+from synthetic import college_lines
+
+# parse_lines as it was before the patterns were precompiled, kept for comparison
+def legacy_parse_lines(fp, college, all_terms):
+    students = {}
+    pattern = {
+            "name_zid" : r'\W?([\w\-\.\' ]+) \((\d{7})\)',
+            "type_program" : r'(?i)^([\w\-]+)\s{5,}(\d{4}\s+\w.*)$',
+            "term" : r'(?i)^\s*((?:term|semester|summer).+?\d{4}\s*$)',
+            "course" : r'(?i)^\s*(\w{4}) ?(\d{4})\s*',
+            "course_tabs" : r'^#?(\w{4}) ?(\d{4})#?((?:[\w\d\:\.,\-\(\)]+ ?)+)#?(\d{2,3})?#?([\w ]+)?'
+        }
+    student = None
+    line = fp.readline()
+    while line:
+        match = re.search(pattern['name_zid'], line)
+        if match:
+            name = match.group(1)
+            zid = match.group(2)
+            if student and zid == student.zid:
+                line = fp.readline()
+                continue
+            elif student:
+                students[student.zid] = student
+            student = Student(name.strip(), zid.strip(), college.strip())
+        match = re.search(pattern['type_program'], line)
+        if match:
+            student.enrol_type = match.group(1).strip().title()
+            student.program = match.group(2).strip()
+        match = re.search(pattern['term'], line)
+        if match:
+            term = match.group().strip()
+            term = term[-4:] + " " + term[:-5]
+            all_terms.add(term)
+            if term not in student.terms:
+                student.terms[term] = []
+        match = re.search(pattern['course'], line)
+        if match:
+            match = re.sub(r'\s{3,}', '#', match.string)
+            match = re.search(pattern['course_tabs'], match)
+            grade = match.group(4) or ''
+            grade_name = match.group(5) or ''
+            course = Course(*map(str.strip, [match.group(1), match.group(2), match.group(3), grade, grade_name]))
+            student.addCourse(term, course)
+        line = fp.readline()
+    if student:
+        students[student.zid] = student
+    return students
+
+class Lines:
+    # minimal file object over a list of lines, supports readline and iteration
+    def __init__(self, lines):
+        self.lines = lines
+        self.i = 0
+    def readline(self):
+        if self.i == len(self.lines):
+            return ''
+        self.i += 1
+        return self.lines[self.i - 1]
+    def __iter__(self):
+        return iter(self.lines)
+
+def best_time(func, lines, repeats):
+    best = None
+    for _ in range(repeats):
+        terms = set()
+        start = time.perf_counter()
+        students = func(Lines(lines), "BASS", terms)
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return best, students, terms
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    lines = college_lines(n_students)
+
+    old, old_students, old_terms = best_time(legacy_parse_lines, lines, repeats)
+    new, new_students, new_terms = best_time(parse_lines, lines, repeats)
+
+    if repr(old_students) != repr(new_students) or old_terms != new_terms:
+        print("MISMATCH: parse_lines output differs from the legacy parser")
+        sys.exit(1)
+
+    print(f"{n_students} students, {len(lines)} lines, best of {repeats}")
+    print(f"legacy parse_lines:  {old:.3f}s  {len(lines) / old:,.0f} lines/s")
+    print(f"parse_lines:         {new:.3f}s  {len(lines) / new:,.0f} lines/s")
+    print(f"speedup:             {old / new:.2f}x")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "BASS.txt")
+        with open(path, 'w') as f:
+            f.writelines(lines)
+        text, text_students, _ = best_time(lambda _, college, terms: parse_file_with(open, path, college, terms), [], repeats)
+        mapped, mapped_students, _ = best_time(lambda _, college, terms: parse_file_with(open_transcript, path, college, terms), [], repeats)
+    if repr(text_students) != repr(mapped_students):
+        print("MISMATCH: parsing the mmap differs from parsing the open file")
+        sys.exit(1)
+    print(f"file, open():        {text:.3f}s  {len(lines) / text:,.0f} lines/s")
+    print(f"file, mmap:          {mapped:.3f}s  {len(lines) / mapped:,.0f} lines/s")
+
+def parse_file_with(opener, path, college, all_terms):
+    with opener(path) as source:
+        return parse_lines(source, college, all_terms)
+
+if __name__ == "__main__":
+    main()
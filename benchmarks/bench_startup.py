@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Startup time of the entry points: each case is run as a new python process, timed from
+# outside, then run once more with -X importtime to list the slowest top level imports and
+# which of the heavy libraries were loaded. The --help, usage error and no cache cases
+# should load none of them.
+# usage: bench_startup.py [--repeats 10] [--top 8] [--json FILE]
+
+import os, sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# libraries only some stages need, reported when a case imports them
+HEAVY = ('openpyxl', 'numpy', 'pypdf', 'pyarrow', 'sqlite3', 'concurrent.futures.process')
+
+# (name, python arguments), run in an empty directory
+CASES = [
+    ("python", ["-c", "pass"]),
+    ("college_academics --help", [os.path.join(ROOT, "college_academics.py"), "--help"]),
+    ("college_academics usage error", [os.path.join(ROOT, "college_academics.py")]),
+    ("statistics no cache", [os.path.join(ROOT, "statistics.py")]),
+    ("import college_academics", ["-c", "import college_academics"]),
+    ("import service", ["-c", "import service"]),
+]
+
+def run(args, directory, importtime=False):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    flags = ["-X", "importtime"] if importtime else []
+    return subprocess.run([sys.executable] + flags + args, cwd=directory, env=env, capture_output=True, text=True)
+
+# {module: (self microseconds, cumulative microseconds, depth)} from -X importtime output
+def import_times(stderr):
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2)
+    return times
+
+def measure(args, directory, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(args, directory)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process startup and import time of the entry points.")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--top", type=int, default=8, help="slowest top level imports to list per case")
+    parser.add_argument("--json", help="save results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, case) in CASES:
+            best, median = measure(case, directory, args.repeats)
+            times = import_times(run(case, directory, importtime=True).stderr)
+            top = sorted(((cumulative, module) for (module, (_, cumulative, depth)) in times.items() if depth == 0), reverse=True)
+            heavy = [module for module in HEAVY if module in times]
+            results.append({'case': name, 'best_seconds': best, 'median_seconds': median,
+                            'import_seconds': sum(c for (c, _) in top) / 1e6, 'heavy_imports': heavy,
+                            'top_imports': [{'module': module, 'seconds': c / 1e6} for (c, module) in top[:args.top]]})
+
+            r = results[-1]
+            print(f"{name:<32}{r['best_seconds'] * 1000:8.1f} ms best {r['median_seconds'] * 1000:8.1f} ms median"
+                  f"{r['import_seconds'] * 1000:8.1f} ms imports   heavy: {', '.join(heavy) or '-'}")
+            for entry in r['top_imports']:
+                print(f"    {entry['module']:<40}{entry['seconds'] * 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeats': args.repeats, 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
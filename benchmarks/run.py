@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# Benchmark suite: parse, wam calculation, statistics and both excel exporters on synthetic
+# transcripts at several scales, reporting time, throughput and peak memory
+# usage: run.py [--scales 50,500,2000] [--colleges 7] [--terms 6] [--courses 3] [--repeats 3]
+#               [--no-memory] [--json FILE] [--compare FILE] [--tolerance 0.25]
+# Scales are students per college. Times are the best of --repeats runs; peak memory comes
+# from one more run under tracemalloc, so tracing doesn't slow the timed runs.
+# --json saves the results, --compare checks them against saved results and exits with
+# status 1 if any step is slower than the saved time by more than --tolerance
+
+import os, sys
+import json
+import time
+import tempfile
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from config import *
+import wam_engine
+from college_academics import parse_college_name, parse_file, get_statistics, export_to_excel
+from synthetic import write_dataset
+
+# best time of func() over repeats runs, and its peak traced memory if memory is set
+def measure(func, repeats, memory):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+# benchmark steps for one dataset: list of (name, function, units, number of units)
+def steps(paths, directory):
+    files = [(path, parse_college_name(os.path.basename(path).split()[0])) for path in paths]
+
+    # parsed once up front for the later steps
+    college_data = {}
+    all_terms = set()
+    for (path, college) in files:
+        students, terms = parse_file(path, college)
+        college_data[college] = students
+        all_terms |= terms
+    n_students = sum(len(students) for students in college_data.values())
+    n_lines = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            n_lines += f.read().count(b'\n')
+    for students in college_data.values():
+        for student in students.values():
+            student.process_wams()
+    n_enrolments = sum(len(s.terms) for students in college_data.values() for s in students.values())
+
+    # the term with the most students, as a release-day export would be
+    counts = {}
+    for students in college_data.values():
+        for s in students.values():
+            for term in s.terms:
+                counts[term] = counts.get(term, 0) + 1
+    term = max(sorted(counts), key=counts.get)
+    engines = wam_engine.build_engines(college_data) if wam_engine.available else None
+
+    def parse():
+        for (path, college) in files:
+            parse_file(path, college)
+
+    def process_wams():
+        for students in college_data.values():
+            for student in students.values():
+                student.process_wams()
+
+    def engine_wams():
+        wam_engine.build_engines(college_data)
+
+    def statistics():
+        for students in college_data.values():
+            for t in all_terms:
+                get_statistics(students, t)
+
+    def engine_statistics():
+        for engine in engines.values():
+            for t in all_terms:
+                engine.statistics(t)
+
+    def export(write_only):
+        filename = os.path.join(directory, f"export_{write_only}.xlsx")
+        def run():
+            if os.path.isfile(filename):
+                os.remove(filename)
+            export_to_excel(filename, college_data, term, engines, write_only)
+        return run
+
+    result = [
+        ("parse", parse, "lines", n_lines),
+        ("process_wams", process_wams, "students", n_students),
+        ("statistics", statistics, "enrolments", n_enrolments),
+        ("export_to_excel", export(False), "students", n_students),
+        ("export_to_excel write_only", export(True), "students", n_students),
+    ]
+    if engines:
+        result.insert(2, ("wam_engine", engine_wams, "students", n_students))
+        result.insert(4, ("wam_engine statistics", engine_statistics, "enrolments", n_enrolments))
+    return result
+
+def run_scale(n_students, args):
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, args.colleges, n_students, args.terms, args.courses, args.seed)
+        results = []
+        for (name, func, units, n) in steps(paths, directory):
+            # export_to_excel prints a line per college
+            stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+            try:
+                secs, peak = measure(func, args.repeats, args.memory)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            results.append({'step': name, 'students': n_students * args.colleges, 'seconds': secs,
+                            'units': units, 'per_second': n / secs if secs else None, 'peak_memory': peak})
+            print_result(results[-1])
+        return results
+
+def print_result(r):
+    peak = f"{r['peak_memory'] / 2**20:8.1f} MB" if r['peak_memory'] is not None else ""
+    print(f"{r['students']:>8}  {r['step']:<28}{r['seconds']:9.3f}s  {r['per_second']:>12,.0f} {r['units']}/s  {peak}")
+
+# steps slower than in the saved results by more than tolerance, as messages
+def regressions(results, saved, tolerance):
+    saved = {(r['step'], r['students']): r for r in saved}
+    slower = []
+    for r in results:
+        old = saved.get((r['step'], r['students']))
+        if old and r['seconds'] > old['seconds'] * (1 + tolerance):
+            slower.append(f"{r['step']} ({r['students']} students): {old['seconds']:.3f}s -> {r['seconds']:.3f}s")
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, wams, statistics and excel export on synthetic transcripts.")
+    parser.add_argument("--scales", default="50,500,2000", help="comma separated students per college (default: 50,500,2000)")
+    parser.add_argument("--colleges", type=int, default=7)
+    parser.add_argument("--terms", type=int, default=6, help="terms per student")
+    parser.add_argument("--courses", type=int, default=3, help="courses per term")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc run")
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument("--compare", help="compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown for --compare (default: 0.25)")
+    args = parser.parse_args()
+
+    print(f"{args.colleges} colleges, {args.terms} terms, {args.courses} courses per term, "
+          f"numpy engine {'on' if wam_engine.available else 'off'}, best of {args.repeats}\n")
+    results = []
+    for scale in args.scales.split(','):
+        results += run_scale(int(scale), args)
+
+    report = {'python': sys.version.split()[0], 'colleges': args.colleges, 'terms': args.terms,
+              'courses': args.courses, 'seed': args.seed, 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = regressions(results, json.load(f)['results'], args.tolerance)
+        if slower:
+            print("\nREGRESSIONS:")
+            for message in slower:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Synthetic pdftotext -layout transcripts for benchmarks
+# Lines follow the name_zid, type_program, term and course patterns in transcript.py
+# Run directly to write a data directory of college transcript files:
+#   synthetic.py <dirname> [--colleges 7] [--students 300] [--terms 6] [--courses 3] [--seed 0]
+
+import os
+import random
+import argparse
+
+GRADES = [(85, 100, "HIGH DISTINCTION"), (75, 84, "DISTINCTION"), (65, 74, "CREDIT"),
+          (50, 64, "PASS"), (0, 49, "FAIL")]
+UNGRADED = ["SATISFACTORY", "SUCCESSFUL", "ABSENT FAIL", ""]
+SUBJECTS = ["COMP", "MATH", "PHYS", "ENGG", "ELEC", "CHEM", "BABS", "ACCT", "ECON", "PSYC"]
+WORDS = ["INTRODUCTION", "TO", "PROGRAMMING", "FUNDAMENTALS", "DATA", "STRUCTURES", "AND",
+         "ALGORITHMS", "MATHEMATICS", "1A", "HIGHER", "PHYSICS", "DESIGN", "SYSTEMS", "ANALYSIS"]
+FIRST_NAMES = ["Saurav", "Charlotte", "Wei", "Olivia", "James", "Priya", "Lucas", "Mia", "Noah", "Ava"]
+LAST_NAMES = ["SMITH", "NGUYEN", "CHEN", "PATEL", "O'BRIEN", "WILLIAMS", "LE-ROUX", "KIM"]
+
+PROGRAMS = [("Undergraduate", "3785    ENGINEERING (HONS) / COMP SCI - BE(Hons), BSc"),
+            ("Undergraduate", "3502    COMMERCE - BCom"),
+            ("Undergraduate", "3970    SCIENCE - BSc"),
+            ("Postgraduate", "8543    INFORMATION TECHNOLOGY - MIT")]
+# file name prefix of each college, as recognised by parse_college_name
+COLLEGES = ["Basser", "Baxter", "Colombo", "FTH", "Goldstein", "Hall", "IH"]
+
+# semester then trimester era terms as they appear in transcripts, oldest first
+TERMS = [f"{name} {year}" for year in range(2015, 2019)
+         for name in ("SUMMER SEMESTER", "SEMESTER 1", "SEMESTER 2")] + \
+        [f"{name} {year}" for year in range(2019, 2030)
+         for name in ("SUMMER TERM", "TERM 1", "TERM 2", "TERM 3")]
+
+def course_line(rng):
+    code = f"{rng.choice(SUBJECTS)}{rng.randint(1000, 4999)}"
+    name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    if rng.random() < 0.85:
+        low, high, grade_name = rng.choice(GRADES)
+        mark = str(rng.randint(low, high))
+    else:
+        mark, grade_name = '', rng.choice(UNGRADED)
+    return f"{code}      {name:<52}{mark:>6}      {grade_name}\n"
+
+# lines of one student's transcript, split over pages of about page_lines lines
+def student_lines(rng, zid, n_terms, n_courses, page_lines=45):
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    header = [f"\f                                  {name} ({zid})\n", "\n"]
+    enrol_type, program = rng.choice(PROGRAMS)
+    lines = header + ["Enrolment History Details\n", "\n",
+                      f"{enrol_type:<25}{program}\n", "\n"]
+    start = rng.randint(0, max(0, len(TERMS) - n_terms))
+    for term in TERMS[start:start + n_terms]:
+        lines.append(f"        {term}\n")
+        for _ in range(n_courses):
+            lines.append(course_line(rng))
+        lines.append("\n")
+
+    # continuation pages repeat the name line
+    pages = []
+    for i in range(0, len(lines), page_lines):
+        page = lines[i:i + page_lines]
+        if i:
+            page = header + page
+        pages.extend(page)
+        pages.append(f"                                                        Page {i // page_lines + 1}\n")
+    return pages
+
+# lines of a whole college file
+def college_lines(n_students, n_terms=6, n_courses=3, seed=0, zid_start=5000000):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_students):
+        lines.extend(student_lines(rng, zid_start + i, n_terms, n_courses))
+    return lines
+
+# write a transcript txt file per college into directory, returns the file paths
+# each college has its own zid range and seed, so files don't depend on n_colleges
+def write_dataset(directory, n_colleges=len(COLLEGES), n_students=300, n_terms=6, n_courses=3, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, college in enumerate(COLLEGES[:n_colleges]):
+        path = os.path.join(directory, f"{college} Transcripts.txt")
+        with open(path, 'w') as f:
+            f.writelines(college_lines(n_students, n_terms, n_courses, seed * 100 + i, 5000000 + i * 100000))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic college transcript txt files.")
+    parser.add_argument("directory")
+    parser.add_argument("--colleges", type=int, default=len(COLLEGES), help=f"number of colleges, up to {len(COLLEGES)}")
+    parser.add_argument("--students", type=int, default=300, help="students per college")
+    parser.add_argument("--terms", type=int, default=6, help="terms per student")
+    parser.add_argument("--courses", type=int, default=3, help="courses per term")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_dataset(args.directory, args.colleges, args.students, args.terms, args.courses, args.seed):
+        print(path)
+
+if __name__ == "__main__":
+    main()
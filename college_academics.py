@@ -1,13 +1,24 @@
 #!/usr/bin/env python3
 
 import os, sys
-import re
-import pickle
+import io
+import json
+import hashlib
+import argparse
+import time
+from functools import lru_cache
+from collections.abc import Mapping
 from config import *
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font
-from openpyxl.styles.alignment import Alignment
-from openpyxl.utils import get_column_letter
+from data_cache import *
+from transcript import parse_lines, open_transcript
+from extract import BACKENDS, extract_pdfs
+import exporters
+from ranking import TermRanking
+import profiling
+from profiling import profiler
+# openpyxl, numpy (wam_engine), sqlite3 (results_db), subprocess and the concurrent.futures
+# pools are slow to import, so they are imported in the functions that use them, and a run
+# that stops early or finds everything cached never loads the ones it doesn't need
 
 
 #FUNCTIONS  
@@ -25,104 +36,124 @@ def parse_college_name(college):
             return key
     return college
   
-def pdf_to_txt(directory):
-    # preprocessing: convert pdfs in dir to txt files
-        for file in os.listdir(directory):
-            if file.endswith(".pdf"):
-                os.system(f"pdftotext -layout {directory}/\'{file}\'")    
-
-def parse_lines(fp, college, all_terms):
-    # data dict
-    students = {}
+# convert a single pdf with pdftotext, returns (path, seconds taken, error message or None)
+def convert_pdf(path):
+    import subprocess
+    start = time.perf_counter()
+    error = None
+    try:
+        subprocess.run(["pdftotext", "-layout", path], check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.decode(errors='replace').strip() or f"exit status {e.returncode}"
+    except OSError as e:
+        error = str(e)
+    return path, time.perf_counter() - start, error
+
+# txt output is up to date if it exists and is no older than the pdf
+def txt_is_current(path):
+    txt = path[:-4] + ".txt"
+    return os.path.isfile(txt) and os.path.getmtime(txt) >= os.path.getmtime(path)
+
+def pdf_to_txt(directory, files=None, workers=pdf_workers):
+    # preprocessing: convert pdfs in dir to txt files, running up to workers conversions at once
+    # files: optional list of pdf paths to convert, default every pdf in directory
+    # returns list of pdf paths that failed to convert
+    if files is None:
+        files = [f'{directory}/{file}' for file in sorted(os.listdir(directory)) if file.endswith(".pdf")]
+    files = [path for path in files if path.endswith(".pdf") and not txt_is_current(path)]
     
-    # patterns for regex
-    pattern = {
-            "name_zid" : '\W?([\w\-\.\' ]+) \((\d{7})\)',
-            "enrolment_history" : '(?i)^enrolment history details$',
-            "type_program" : '(?i)^([\w\-]+)\s{5,}(\d{4}\s+\w.*)$',
-            "term" : '(?i)^\s*((?:term|semester|summer).+?\d{4}\s*$)',
-            # "course" : '(?i)^\s*(\w{4}) ?(\d{4})\s*((?:[\w\d\:\.,-\(\)]+ ?)+?)(?:\s{3,})?(\d{2,3})?\s+?([\w ]+)?'
-            "course" : '(?i)^\s*(\w{4}) ?(\d{4})\s*',
-            "course_tabs" : '^#?(\w{4}) ?(\d{4})#?((?:[\w\d\:\.,\-\(\)]+ ?)+)#?(\d{2,3})?#?([\w ]+)?'
-            
-        }
-        
-    #initialise object variable
-    student = None    
+    failed = []
+    if not files:
+        return failed
     
-   # parse loop
-    line = fp.readline()
-    while line:
-        # Skip empty line
-        if not line:
-            line = fp.readline()
-            continue
-        
-        # match name line
-        match = re.search(pattern['name_zid'], line)
-        if match:
-            name = match.group(1)
-            zid = match.group(2)
-            
-            # skip if start of additional page for existing entry
-            if student and zid == student.zid:
-                line = fp.readline()
-                continue
-            elif student:
-                students[student.zid] = student
-            
-            #new student object
-            student = Student(name.strip(), zid.strip(), college.strip())
-
-        # continue from enrolment history details
-        match = re.search(pattern['type_program'], line)
-        if match:
-            enrol_type = match.group(1)
-            program = match.group(2)
-            student.enrol_type = enrol_type.strip().title()
-            student.program = program.strip()
-        
-        # process terms
-        match = re.search(pattern['term'], line)
-        if match:
-            term = match.group().strip()
-            term = term[-4:] + " " + term[:-5]
-            all_terms.add(term)
-            if term not in student.terms:
-                student.terms[term] = []
-            
-        # process courses
-        match = re.search(pattern['course'], line)
-        if match:
-            #
-            match = re.sub('\s{3,}', '#', match.string)
-            match = re.search(pattern['course_tabs'], match)
-            #
-            code_name = match.group(1)
-            code_num = match.group(2)
-            name = match.group(3)
-            grade = match.group(4)
-            grade_name = match.group(5)
-            
-            grade = '' if not grade else grade
-            grade_name = '' if not grade_name else grade_name
-            
-            course = Course(*map(str.strip, [code_name, code_num, name, grade, grade_name]))
-            student.addCourse(term, course)
-        
-        line = fp.readline()
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    start = time.perf_counter()
+    with profiler.stage('pdf_to_txt', pdfs=len(files)) as counts, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for future in as_completed([pool.submit(convert_pdf, path) for path in files]):
+            path, secs, error = future.result()
+            if error:
+                failed.append(path)
+                print(f"Failed to convert {path} ({secs:.2f}s): {error}")
+            else:
+                print(f"Converted {path} ({secs:.2f}s)")
+        counts['failed'] = len(failed)
+    print(f"Converted {len(files) - len(failed)}/{len(files)} pdfs in {time.perf_counter() - start:.2f}s\n")
+    return failed
+
+# extract the text of pdfs in memory with an extract.py backend, instead of pdf_to_txt
+# paths: source paths, txt files among them are left for parse_file to read
+# returns (dict of pdf path:text, list of pdf paths that failed to extract)
+def extract_files(paths, backend=pdf_backend, workers=pdf_workers):
+    files = [path for path in paths if path.endswith(".pdf")]
+    texts = {}
+    failed = []
+    if not files:
+        return texts, failed
     
-    if student:
-        students[student.zid] = student
-        
-    return students
+    start = time.perf_counter()
+    with profiler.stage('extract', pdfs=len(files)) as counts:
+        for path, (text, info) in extract_pdfs(files, backend, workers).items():
+            if text is None:
+                failed.append(path)
+                print(f"Failed to extract {path}: {info}")
+            else:
+                texts[path] = text
+                print(f"Extracted {path} ({info})")
+        counts['failed'] = len(failed)
+    print(f"Extracted {len(files) - len(failed)}/{len(files)} pdfs in {time.perf_counter() - start:.2f}s\n")
+    return texts, failed
 
 
+# parse a single transcript txt file, or its text if already extracted, returns (students dict, set of terms)
+# runs in a worker process when parsing in parallel
+def parse_file(path, college, text=None):
+    terms = set()
+    with profiler.stage('parse', college) as counts:
+        if text is not None:
+            students = parse_lines(io.StringIO(text, newline=None), college, terms)
+        else:
+            with open_transcript(path) as source:
+                students = parse_lines(source, college, terms)
+    if profiler.enabled:
+        # counted after the timed stage, so counting doesn't slow the parse down
+        if text is not None:
+            counts['lines'] = text.count('\n')
+        else:
+            with open(path, 'rb') as fp:
+                counts['lines'] = sum(block.count(b'\n') for block in iter(lambda: fp.read(1 << 20), b''))
+        counts['students'] = len(students)
+        counts['courses'] = sum(len(courses) for s in students.values() for courses in s.terms.values())
+    return students, terms
+
+# parse_file in a worker process, also returns the worker's profiler stages
+def parse_file_job(path, college, text=None):
+    return parse_file(path, college, text), profiler.take()
+
+# parse a list of (path, college) txt files, with up to workers processes
+# texts: optional list of already extracted text for each file, None to read the file
+# returns list of (students dict, set of terms) in the same order as files
+def parse_files(files, workers=parse_workers, texts=None):
+    for (path, college) in files:
+        print(f"Processing {college}...")
+    if texts is None:
+        texts = [None] * len(files)
+    
+    workers = min(workers, len(files))
+    if workers <= 1:
+        return [parse_file(path, college, text) for ((path, college), text) in zip(files, texts)]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=profiling.init_worker, initargs=(profiler.enabled, profiler.trace_memory)) as pool:
+        for (result, stages) in pool.map(parse_file_job, *zip(*files), texts):
+            profiler.add(stages)
+            results.append(result)
+    return results
                 
 # User to select term            
 def pick_term(all_terms):
-    # get term for excel processing
-    all_terms = sorted(all_terms)
+    # get term for excel processing, in chronological order
+    all_terms = sorted(all_terms, key=term_sort_key)
     print()
     for i, k in enumerate(all_terms, 1):
         print(f"{i}. {k} ({convert_term_name(k)})")
@@ -149,268 +180,526 @@ def pick_term(all_terms):
         
     print(f"\nYou have selected: {', '.join(terms)}\n")
     return terms                
-                
-# Print a student dict to excel                
-def export_data(ws, students_dict, term, export_all=False):
-    # Initialise sheet headers
-    col_headers = ["First Names", "Last Name", "zID", "College", "Type", "Program", "Term", "Code", "Course", "Mark", "Grade", "WAM"]
-    for row in ws.iter_rows(min_row=1, max_col=len(col_headers), max_row=1):
-        for i, cell in enumerate(row):
-            cell.value = col_headers[i]
-            cell.font = Font(bold = True)
-           
-    r = 2
-    # print each student's data
-    for zid, student in students_dict.items():
-        # start = r
+
+# Terms from a command line spec of comma separated term codes or code ranges, e.g. "21T1..23T3,22S2"
+# ranges cover every term in all_terms between the two ends; raises ValueError for unknown terms
+def select_terms(spec, all_terms):
+    available = sorted(all_terms, key=term_sort_key)
+    terms = []
+    for part in spec.split(','):
+        ends = [convert_term_name(code) for code in part.split('..')]
+        if None in ends or len(ends) > 2:
+            raise ValueError(f"Invalid term or term range '{part.strip()}'")
+        if len(ends) == 1:
+            if ends[0] not in all_terms:
+                raise ValueError(f"No results for term '{part.strip()}'")
+            selected = ends
+        else:
+            start, end = term_sort_key(ends[0])[:2], term_sort_key(ends[1])[:2]
+            selected = [t for t in available if start <= term_sort_key(t)[:2] <= end]
+        terms += [t for t in selected if t not in terms]
+    return terms
+    
+# Shared cell styles, by name, as the arguments of each openpyxl style attribute. Each row
+# from data_rows/stats_rows is a list of cells, where a cell is None (left empty) or a
+# (value, style name or None) tuple
+STYLES = {
+    'header': {'font': {'bold': True}},
+    'bold': {'font': {'bold': True}},
+    'title': {'font': {'bold': True, 'underline': 'single'}},
+    'italic': {'font': {'italic': True}},
+    'category': {'font': {'underline': 'single', 'italic': True}},
+    'fail': {'font': {'color': 'FF0000'}},
+    'left': {'alignment': {'horizontal': 'left'}},
+}
+
+# STYLES as openpyxl objects, {name: {attribute: Font or Alignment}}, made on first use
+@lru_cache(maxsize=None)
+def cell_styles():
+    from openpyxl.styles import Font, Alignment
+    classes = {'font': Font, 'alignment': Alignment}
+    return {name: {attr: classes[attr](**args) for (attr, args) in attrs.items()} for (name, attrs) in STYLES.items()}
+
+# Rows of a student dict (or any iterable of students, e.g. from transcript.iter_students) sheet
+def data_rows(students_dict, term, export_all=False):
+    # sheet headers
+    yield [(header, 'header') for header in col_widths]
+    
+    students = students_dict.values() if isinstance(students_dict, Mapping) else students_dict
+    # each student's data
+    for student in students:
         min_rows = 3
-        for c, (prop, val) in enumerate(student.__dict__.items(), 1):
-            # print courses
-            if prop == "terms": 
-                if term in val.keys():
-                    # print Term
-                    ws.cell(row=r, column=c, value=term.title())
-                    # print WAM
-                    wam = student.wams[term]
-                    if wam:
-                        wam = float(student.wams[term])
-                    ws.cell(row=r, column=c+5, value=wam)
-                    # print each course from course.__dict__
-                    courses = val[term]
-                    for course in courses:
-                        for i, (c_prop, c_val) in enumerate(course.__dict__.items(), 1):
-                            if c_prop == 'grade' and c_val:
-                                c_val = float(c_val)
-                            if not c_val:
-                                c_val = '-'
-                            ws.cell(row=r, column=c+i, value=c_val).alignment = Alignment(horizontal='left')
-                        r += 1
-                        min_rows -= 1
-                break
-            #print other data
-            else:
-                ws.cell(row=r, column=c, value=val)
+        #student info
+        row = [(val, None) for val in student.info()]
+        # courses
+        if term in student.terms:
+            # Term, then WAM after the course columns
+            row += [(term.title(), None), None, None, None, None, (student.wams[term], None)]
+            # each course, first course on the same row as the student info
+            for course in student.terms[term]:
+                if not row:
+                    row = [None] * (len(Student.info_fields) + 5)
+                for i, c_val in enumerate((course.code, course.name, course.mark, course.grade_name), len(Student.info_fields) + 1):
+                    if not c_val and c_val != 0:
+                        c_val = '-'
+                    row[i] = (c_val, 'left')
+                yield row
+                row = None
+                min_rows -= 1
+        if row:
+            yield row
+            min_rows -= 1
         # pad rows
         while min_rows > 0:
-            r+=1
-            min_rows-=1
+            yield []
+            min_rows -= 1
             
         if not export_all:
-            r += 1
-            
-    # Format columns
-    for i, (_, w) in enumerate(col_widths.items(), 1):
-        ws.column_dimensions[get_column_letter(i)].width = w
-    
-#Print college statistics to excel
-def export_stats(ws, college, students_dict, term):
-    # get stats dict (top_wam, top_sub, avg_wam) for each college
-    college_stats, high_perf, under_perf = get_statistics(students_dict, term)
+            yield []
 
-    r = 1
-    c = 1
-    #print term name
-    ws.column_dimensions['A'].width = 22
-    ws.cell(row=r, column=c, value=f'{term}: {college_names[college].upper()}').font = Font(bold=True, underline='single')
-    r += 1
+# Rows of a college statistics sheet
+def stats_rows(college, students_dict, term, college_stats, high_perf, under_perf):
+    # term name
+    yield [(f'{term}: {college_names[college].upper()}', 'title')]
     
     #if no students that term, exit
     if college_stats["avg_wam"] is None:
-        ws.cell(row=r, column=c, value = 'No residents in this term').font = Font(italic=True)
+        yield [('No residents in this term', 'italic')]
         return
         
     headers = ['Highest Term WAM', 'Best Subject', 'Honorable Mentions (2 or more HDs)']
             
-    # print college name
-    ws.cell(row=r, column=c, value = 'Average WAM:').font = Font(bold=True)
-    ws.cell(row=r, column=c+1, value = f'{college_stats["avg_wam"]:.2f}') 
-    r += 2
-    ws.cell(row=r, column=c, value = 'High Performers:').font = Font(bold=True)
-    r += 1
+    yield [('Average WAM:', 'bold'), (f'{college_stats["avg_wam"]:.2f}', None)]
+    yield []
+    yield [('High Performers:', 'bold')]
     for i, (category, tuples) in enumerate(high_perf.items()):
-        # print category headers
-        r += 1
-        ws.cell(row=r, column=c, value=headers[i]).font = Font(underline='single', italic=True)
-        r += 1
-        # print category data
+        # category headers
+        yield []
+        yield [(headers[i], 'category')]
+        # category data
         for tupl in tuples:
             zid = tupl[0]
             name = students_dict[zid].first_names + ' ' + students_dict[zid].last_name
             
-            ws.cell(row=r, column=c, value=name) # print name
-            c += 1
             if category == 'top_wam':
-                ws.cell(row=r, column=c, value=tupl[1]).alignment = Alignment(horizontal='left') # print wam
+                yield [(name, None), (tupl[1], 'left')] # name, wam
             elif category == 'top_sub':
-                ws.cell(row=r, column=c, value=f'{tupl[2]}').alignment = Alignment(horizontal='left') # print mark
-                ws.cell(row=r, column=c+1, value=f'{tupl[1]}').alignment = Alignment(horizontal='left') # print subject
+                yield [(name, None), (f'{tupl[2]}', 'left'), (f'{tupl[1]}', 'left')] # name, mark, subject
             elif category == 'full_hd':
-                ws.cell(row=r, column=c, value=f'{tupl[1]}/{tupl[2]}').alignment = Alignment(horizontal='left') # print hd/total
-            r += 1
-            c = 1
+                yield [(name, None), (f'{tupl[1]}/{tupl[2]}', 'left')] # name, hd/total
+            else:
+                yield [(name, None)]
             
-    r += 1            
-    ws.cell(row=r, column=c, value = 'Underperformers:').font = Font(bold=True)
-    r += 1            
+    yield []
+    yield [('Underperformers:', 'bold')]
         
     for zid, courses in under_perf.items():
         student = students_dict[zid]
         name = student.first_names + ' ' + student.last_name
         wam = student.wams[term]
         
-        r += 1            
-        ws.cell(row=r, column=c, value=name)
-        ws.cell(row=r, column=c+1, value = f'WAM: {wam}')
-        
+        yield []
+        row = [(name, None), (f'WAM: {wam}', None)]
+        # each course, first course on the same row as the name
         for course in courses:
-            for i, (c_prop, c_val) in enumerate(course.__dict__.items(), 2):
+            if not row:
+                row = [None, None]
+            for c_val in course.values():
                 if not c_val:
                     c_val = '-'
-                ws.cell(row=r, column=c+i, value=c_val)
-                if c_val.upper() in ("FAIL", "ABSENT FAIL", "UNSATISFACTORY FAIL", "ACADEMIC WITHDRAWAL"):
-                    ws.cell(row=r, column=c+i).font = Font(color='FF0000')
-            r += 1
+                row.append((c_val, 'fail' if c_val.upper() in FAIL_GRADES else None))
+            yield row
+            row = None
+        if row:
+            yield row
+
+# Write rows to a normal worksheet, starting at row 1
+def write_rows(ws, rows):
+    styles = cell_styles()
+    for r, row in enumerate(rows, 1):
+        for c, cell in enumerate(row, 1):
+            if cell is None:
+                continue
+            value, style = cell
+            cell = ws.cell(row=r, column=c, value=value)
+            if style:
+                for attr, val in styles[style].items():
+                    setattr(cell, attr, val)
+
+# Append rows to a write-only worksheet, styles must be registered with add_named_styles
+def append_rows(ws, rows):
+    from openpyxl.cell import WriteOnlyCell
+    for row in rows:
+        cells = []
+        for cell in row:
+            if cell is None or cell[1] is None:
+                cells.append(cell and cell[0])
+            else:
+                cell, style = WriteOnlyCell(ws, value=cell[0]), cell[1]
+                cell.style = style
+                cells.append(cell)
+        ws.append(cells)
+
+# register STYLES as named styles of a workbook, for write-only sheets
+def add_named_styles(wb):
+    from openpyxl.styles import NamedStyle
+    for name, attrs in cell_styles().items():
+        wb.add_named_style(NamedStyle(name=name, **attrs))
+
+# students of a student dict (or any iterable of students) for data_rows, counted into
+# counts['students'] as they are read when profiling, so an iterator is only read once and
+# a MergedView (ALL) isn't walked again just to count it
+def counted(students_dict, counts):
+    if not profiler.enabled:
+        return students_dict
+    return counting(students_dict.values() if isinstance(students_dict, Mapping) else students_dict, counts)
+
+def counting(students, counts):
+    counts['students'] = 0
+    for student in students:
+        counts['students'] += 1
+        yield student
+
+# Print a student dict (or any iterable of students) to excel
+def export_data(ws, students_dict, term, export_all=False):
+    from openpyxl.utils import get_column_letter
+    with profiler.stage('export_data', ws.title, term) as counts:
+        write_rows(ws, data_rows(counted(students_dict, counts), term, export_all))
             
-#Iterate through all colleges and print to Excel
-def export_to_excel(filename, college_data, term):    
-    #create "ALL" data entry
-    college_data["ALL"] = {}
+    # Format columns
+    for i, (_, w) in enumerate(col_widths.items(), 1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+
+#Print college statistics to excel
+# engine: optional wam_engine.WamEngine for students_dict, used in place of get_statistics
+# college: name the time taken is profiled under
+def college_statistics(students_dict, term, engine=None, college=None):
+    with profiler.stage('statistics', college, term) as counts:
+        if engine:
+            stats = engine.statistics(term)
+        else:
+            stats = get_statistics(students_dict, term)
+    if profiler.enabled and isinstance(students_dict, dict):
+        counts['students'] = len(students_dict)
+    return stats
+
+def export_stats(ws, college, students_dict, term, engine=None, stats=None):
+    # get stats dict (top_wam, top_sub, avg_wam) for each college, unless already worked out
+    if stats is None:
+        stats = college_statistics(students_dict, term, engine, college)
+    ws.column_dimensions['A'].width = 22
+    with profiler.stage('export_stats', college, term):
+        write_rows(ws, stats_rows(college, students_dict, term, *stats))
+
+# Sheet fingerprints: a hash of the rows written to each sheet, saved next to the workbook so
+# a later export of the same term only rewrites the sheets whose rows changed.
+# Bump FINGERPRINT_VERSION when the way rows are written to a sheet changes
+FINGERPRINT_VERSION = 1
+
+def fingerprint_path(filename):
+    return os.path.splitext(filename)[0] + ".sheets.json"
+
+def sheet_fingerprint(rows):
+    h = hashlib.sha1(f"{FINGERPRINT_VERSION} {col_widths} {college_colours}".encode())
+    for row in rows:
+        h.update(repr(row).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+# dict of sheet:fingerprint saved for a workbook, empty if there are none or the workbook
+# has been changed since they were saved
+def load_fingerprints(filename):
+    try:
+        with open(fingerprint_path(filename)) as f:
+            saved = json.load(f)
+        st = os.stat(filename)
+    except (OSError, ValueError):
+        return {}
+    if saved.get('size') != st.st_size or saved.get('mtime') != st.st_mtime:
+        return {}
+    return saved.get('sheets', {})
+
+def save_fingerprints(filename, sheets):
+    st = os.stat(filename)
+    with open(fingerprint_path(filename), 'w') as f:
+        json.dump({'size': st.st_size, 'mtime': st.st_mtime, 'sheets': sheets}, f, indent=1)
+
+# replace sheet name in wb with a new empty sheet in the same place, or add it at the end
+def new_sheet(wb, name):
+    if name in wb.sheetnames:
+        index = wb.sheetnames.index(name)
+        del wb[name]
+        return wb.create_sheet(name, index)
+    return wb.create_sheet(name)
+
+# One term's workbook, exported a college at a time as each college's data is ready
+# Sheets whose fingerprint matches the one saved at the last export are left as they are,
+# and the workbook is only loaded (or created) once there is a sheet to write
+# write_only: build a new workbook in openpyxl's streaming write-only mode, rows are written
+#   out as they are produced instead of held as a cell grid. Any existing file is replaced
+class WorkbookExport:
     
-    # overwrite flag
-    # overwrite = 'N'
+    def __init__(self, filename, term, write_only=False):
+        self.filename = filename
+        self.term = term
+        self.write_only = write_only
+        self.saved = {} if write_only else load_fingerprints(filename)
+        self.fingerprints = {}
+        self.wb = None
+        self.existing = []  # sheet names of the workbook as it was loaded
     
-    if os.path.isfile(filename):
-        wb = load_workbook(filename)
-    else:
-        wb = Workbook()
-        del wb["Sheet"]
+    def workbook(self):
+        if self.wb is None:
+            from openpyxl import Workbook, load_workbook
+            if self.write_only:
+                self.wb = Workbook(write_only=True)
+                add_named_styles(self.wb)
+            elif os.path.isfile(self.filename):
+                self.wb = load_workbook(self.filename)
+            else:
+                self.wb = Workbook()
+                del self.wb["Sheet"]
+            self.existing = list(self.wb.sheetnames)
+        return self.wb
     
-    for college in college_data:   
-        if college != "ALL":
-            college_data["ALL"].update(college_data[college])
-        
-        print (f"Exporting {college}...")
-        
-        #get worksheet object for college
-        if college in wb.sheetnames:
-            # if overwrite.lower() != '-y':
-            #     overwrite = input(f"Sheet '{college}' already exists, do you want to overwrite? Y/N (or -Y to overwrite all): ")
-            #     if overwrite.lower() not in ('y', '-y'):
-            #         continue
-            del wb[college]
-        ws = wb.create_sheet(college)
+    # new empty sheet to write for college, or None if the sheet is unchanged
+    def sheet(self, name, college, fingerprint):
+        self.fingerprints[name] = fingerprint
+        if self.saved.get(name) == fingerprint:
+            return None
+        ws = new_sheet(self.workbook(), name)
         ws.sheet_properties.tabColor = college_colours[college] 
-        ws.title = college
-        
+        return ws
+    
+    # a college's data and statistics sheets, or the ALL sheet (data only)
+    # engine: optional wam_engine.WamEngine for the college
+    def add_college(self, college, students_dict, engine=None):
+        from openpyxl.utils import get_column_letter
+        term = self.term
         export_all = True if college == "ALL" else False    
-        export_data(ws, college_data[college], term, export_all)
+        
+        #get worksheet object for college, unless it is unchanged
+        with profiler.stage('fingerprint', college, term):
+            ws = self.sheet(college, college, sheet_fingerprint(data_rows(students_dict, term, export_all)))
+        if ws is None:
+            print (f"Unchanged {college}")
+        else:
+            print (f"Exporting {college}...")
+            if self.write_only:
+                # column widths have to be set before any rows are written
+                for i, (_, w) in enumerate(col_widths.items(), 1):
+                    ws.column_dimensions[get_column_letter(i)].width = w
+                with profiler.stage('export_data', college, term) as counts:
+                    append_rows(ws, data_rows(counted(students_dict, counts), term, export_all))
+            else:
+                export_data(ws, students_dict, term, export_all)
         
         if not export_all:
             # Individual College statistics:
-                       
-            stats_ws = college + "_stats"
-            if stats_ws in wb.sheetnames:
-                del wb[stats_ws]
-            ws = wb.create_sheet(stats_ws)
-            ws.sheet_properties.tabColor = college_colours[college] 
-            ws.title = stats_ws
-            
-            export_stats(ws, college, college_data[college], term)
+            stats = college_statistics(students_dict, term, engine, college)
+            with profiler.stage('fingerprint', college, term):
+                ws = self.sheet(college + "_stats", college, sheet_fingerprint(stats_rows(college, students_dict, term, *stats)))
+            if ws is None:
+                return
             
+            if self.write_only:
+                ws.column_dimensions['A'].width = 22
+                with profiler.stage('export_stats', college, term):
+                    append_rows(ws, stats_rows(college, students_dict, term, *stats))
+            else:
+                export_stats(ws, college, students_dict, term, stats=stats)
+    
+    # add the ALL sheet and save, once every college in college_data has been added
+    def finish(self, college_data):
+        #"ALL" sheet after the colleges, a view of every college's students that copies nothing
+        self.add_college("ALL", MergedView(college_data.values()))
+        if self.wb is None:
+            print(f"No changes to {self.filename}")
+            return
+        wb = self.wb
+        
+        # sheets that were already in the workbook keep their place, new ones go after them
+        # in college_data order, whatever order the colleges were added in
+        names = [name for college in college_data for name in (college, college + "_stats")] + ["ALL"]
+        order = [name for name in self.existing if name in wb.sheetnames] + [name for name in names if name in self.fingerprints and name not in self.existing]
+        for i, name in enumerate(order):
+            wb.move_sheet(name, i - wb.sheetnames.index(name))
+        
+        with profiler.stage('save', term=self.term):
+            wb.save(self.filename)
         
-    if "Sheet" in wb.sheetnames:
-        del wb["Sheet"]
-    wb.save(filename)
+        # sheets from earlier exports that weren't exported this time are kept
+        saved = self.saved
+        if not self.write_only:
+            saved = {sheet: fp for (sheet, fp) in saved.items() if sheet in wb.sheetnames}
+        save_fingerprints(self.filename, {**saved, **self.fingerprints})
+
+#Iterate through all colleges and print to Excel
+# engines: optional dict of college:WamEngine from statistics_engines
+# write_only: see WorkbookExport
+# If the workbook already exists, only sheets whose rows changed since the last export
+# are written again (see sheet fingerprints above), and it isn't saved if none changed
+# college_data itself is left as it is
+def export_to_excel(filename, college_data, term, engines=None, write_only=False):    
+    export = WorkbookExport(filename, term, write_only)
+    for college in college_data:
+        export.add_college(college, college_data[college], engines.get(college) if engines else None)
+    export.finish(college_data)
+    
+# Export a term's students and stats tables in one of exporters.FORMATS, base is the path
+# without an extension. returns list of paths written
+def export_tables(base, fmt, college_data, term, engines=None):
+    stats = {}
+    for college in college_data:
+        engine = engines.get(college) if engines else None
+        stats[college] = college_statistics(college_data[college], term, engine, college)
+    print (f"Exporting {term} {fmt}...")
+    with profiler.stage('export_tables', term=term):
+        return exporters.export_term_tables(base, fmt, college_data, term, stats)
+
+# state of an export worker process, set once per process by init_export_worker
+export_state = {}
+
+# profile: (enabled, trace_memory) of the parent's profiler, in worker processes
+def init_export_worker(college_data, engines, write_only, profile=None, fmt='xlsx'):
+    export_state.update(college_data=college_data, engines=engines, write_only=write_only, fmt=fmt)
+    if profile:
+        profiling.init_worker(*profile)
+
+# returns list of paths written
+def export_term(filename, term):
+    if export_state['fmt'] != 'xlsx':
+        return export_tables(filename, export_state['fmt'], export_state['college_data'], term, export_state['engines'])
+    export_to_excel(filename, export_state['college_data'], term, export_state['engines'], export_state['write_only'])
+    return [filename]
+
+# export_term in a worker process, also returns the worker's profiler stages
+def export_term_job(filename, term):
+    return export_term(filename, term), profiler.take()
+
+# file name of a term's export, without extension. An export of only some colleges (-c) has
+# their names added, so it never replaces the export of every college
+def export_name(term, colleges=None):
+    name = "College_Academics_" + convert_term_name(term)
+    if colleges:
+        name += "_" + "_".join(sorted(set(colleges)))
+    return name
+
+# Export a workbook per term into output_dir, with up to jobs terms exported in parallel
+# fmt: 'xlsx', or one of exporters.FORMATS for flat table files per term
+# colleges: the -c colleges college_data was narrowed to, None for all, see export_name
+# returns list of paths written
+def export_terms(terms, college_data, engines=None, output_dir='.', jobs=1, write_only=False, fmt='xlsx', colleges=None):
+    os.makedirs(output_dir, exist_ok=True)
+    extension = ".xlsx" if fmt == 'xlsx' else ""
+    filenames = [os.path.join(output_dir, export_name(term, colleges) + extension) for term in terms]
+    
+    jobs = min(jobs, len(terms))
+    if jobs <= 1:
+        init_export_worker(college_data, engines, write_only, fmt=fmt)
+        return [path for (filename, term) in zip(filenames, terms) for path in export_term(filename, term)]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    profile = (profiler.enabled, profiler.trace_memory)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_export_worker, initargs=(college_data, engines, write_only, profile, fmt)) as pool:
+        for (paths, stages) in pool.map(export_term_job, filenames, terms):
+            profiler.add(stages)
+            results += paths
+    return results
     
 # Processes a students dict (for a particular college) and returns statistics dict    
 # returns tuple of dicts (college_stats, high_perf, under_perf)
+# see ranking.TermRanking, which also answers top-k and rank queries for the term
 def get_statistics(students, term):
-    college_stats = {}
-    high_perf = {} # dict of lists of 
-    under_perf = {}
-    
-    # college_stats
-    total_wam = 0
-    wam_count = 0
-    
-    # high_perf
-    # lists of tuples for highest (zid, wam), (zid, code+subject, mark), (zid, hd_count, satis_count)
-    top_wam = [('<None>', 0)]
-    top_sub = [('<None>', '<None>', 0)]
-    # fulfilling 2/2 or 3/3 HDs
-    full_hd = []
-    also_wam = None #get 2nd best subjects prizes if zid is also highest wam
+    return TermRanking(students, term).statistics()
+
+
+
+# Per-file cache: only new or changed files in directory are converted and parsed,
+# entries for files no longer in the directory are dropped, and the cache is saved if
+# anything changed. returns (entries, whether any files were parsed, whether anything changed)
+def update_entries(directory, entries, backend=pdf_backend):
+    with profiler.stage('check_sources'):
+        entries, stale, dirty = check_sources(directory, entries)
     
+    parsed = bool(stale)
+    if stale:
+        # Get the text of changed pdfs, in memory or as txt files
+        if backend == 'file':
+            failed = pdf_to_txt(directory, [path for (path, *_) in stale])
+            texts = {}
+        else:
+            texts, failed = extract_files([path for (path, *_) in stale], backend)
         
-    for zid in students:
-        if term not in students[zid].terms.keys():
-            continue
-        t_wam = top_wam[0][1]
-        wam = students[zid].wams[term]
-        if wam:
-            #check if any subjects are higher, and add to top_sub if so        
-            wam = float(wam)
-            #check is wam higher, and add to top_wam if so        
-            if wam > t_wam:
-                top_wam.clear()
-            if wam >= t_wam:
-                top_wam.append((zid, wam))
-                
-            # for average college wam
-            wam_count += 1
-            total_wam += wam
+        # left out of the cache so they are retried on the next run
+        stale = [file for file in stale if file[0] not in failed]
         
-        #keep track of number of HDs or fails
-        hd_count = 0
-        fail_count = 0
-        for sub in students[zid].terms[term]:
-            t_sub = top_sub[0][2] 
-            
-            if sub.hasGrade():
-                grade = int(sub.grade)
-                if grade >= t_sub:
-                    if zid in [item for tup in top_wam for item in tup]: #if zid also highest wam
-                        if not also_wam or grade > also_wam[2]:
-                            also_wam = (zid, sub.code + ' ' + sub.name, grade)
-                    else:
-                        if grade > t_sub:
-                            top_sub.clear()
-                        top_sub.append((zid, sub.code + ' ' + sub.name, grade))
-                        
-            if sub.grade_name.upper() == "HIGH DISTINCTION":
-                hd_count += 1
-            elif sub.grade_name.upper() in ("FAIL", "ABSENT FAIL", "UNSATISFACTORY FAIL", "ACADEMIC WITHDRAWAL"):
-                fail_count += 1
-                
-        sub_count = len(students[zid].terms[term]) #total subjects taken
-                
-        #add to full_hd if 2 or more HDs
-        # if hd_count + sy_count == len(students[zid].terms[term]) \
-        if hd_count >= 2:
-            full_hd.append((zid, hd_count, sub_count))
+        # Parse each changed file into its own cache entry
+        colleges = [parse_college_name(os.path.basename(path).split()[0]) for (path, *_) in stale]
+        results = parse_files([(txt_path(path), college) for ((path, *_), college) in zip(stale, colleges)],
+                              texts=[texts.get(path) for (path, *_) in stale])
         
-        #flag if they have failed or is sitting on a Pass   
-        if fail_count or (wam and wam < 60):
-            under_perf[zid] = students[zid].terms[term]
+        for ((path, size, mtime, digest), college, (students, terms)) in zip(stale, colleges, results):
+            entries[path] = FileEntry(path, size, mtime, digest, college, students, terms)
     
-    if top_sub[0][0] == '<None>':
-        top_sub.clear()
-    if also_wam and also_wam[0] in [item for tup in top_wam for item in tup]: #if also_wam person is in top_wam
-        top_sub.insert(0, also_wam)
-    
-    college_stats = {'avg_wam': total_wam/wam_count} if wam_count > 0 else {'avg_wam': None}
-    high_perf = {'top_wam': top_wam, 'top_sub': top_sub, 'full_hd': full_hd}    
-        
-    return college_stats, high_perf, under_perf
+    if parsed or dirty:
+        with profiler.stage('save_cache', files=len(entries)):
+            save_file_cache(entries)
+    return entries, parsed, parsed or dirty
 
+# precalculate all wams
+def calculate_wams(college_data):
+    for c in college_data:
+        with profiler.stage('wams', c, students=len(college_data[c])):
+            for s in college_data[c]:
+                college_data[c][s].process_wams()
 
+# numpy statistics engines (see wam_engine.py) for statistics of n_terms terms, or any number
+# if None. Building one costs about as much as engine_min_terms get_statistics calls, so
+# fewer terms are quicker without them. Wams should be calculated first
+# returns dict of college:WamEngine, empty without numpy or for fewer terms
+def statistics_engines(college_data, n_terms=None):
+    import wam_engine
+    if not wam_engine.available or (n_terms is not None and n_terms < engine_min_terms):
+        return {}
+    engines = {}
+    for c in college_data:
+        with profiler.stage('engines', c, students=len(college_data[c])):
+            engines[c] = wam_engine.WamEngine(college_data[c])
+    return engines
 
 ########
 # MAIN #
 ########
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export college academic results to Excel workbooks.")
+    parser.add_argument("directory", nargs="?", help="directory of transcript pdf/txt files (default: data)")
+    parser.add_argument("-t", "--terms", help="terms to export as codes or ranges, e.g. 21T1..23T3,22S2 (asks if not given)")
+    parser.add_argument("-c", "--college", action="append", help="only export these colleges, e.g. -c IH -c fig_tree or -c IH,FTH, into their own files (College_Academics_22T3_FTH_IH.xlsx)")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write workbooks to (default: current directory)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of term workbooks to export in parallel (default: 1)")
+    parser.add_argument("--write-only", action="store_true", default=excel_write_only, help="write workbooks in streaming write-only mode")
+    parser.add_argument("--format", choices=('xlsx',) + exporters.FORMATS, default='xlsx',
+                        help="xlsx workbooks, or csv/jsonl/parquet table files per term plus College_Stats wam trends (default: xlsx)")
+    parser.add_argument("--pdf-backend", choices=['file'] + list(BACKENDS), default=pdf_backend,
+                        help=f"how pdfs are turned into text: in memory with pdftotext or pypdf, or 'file' to write txt files next to them (default: {pdf_backend})")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap pdf conversion, parsing, wams and workbook writing instead of running them one after the other (needs -t)")
+    parser.add_argument("--db", help="also keep the results in this SQLite database, for indexed queries")
+    parser.add_argument("--history", nargs="?", const="cache/history.db", metavar="FILE",
+                        help="also keep every student's term wams in this history index, for trend and drop queries with history.py (default: cache/history.db)")
+    parser.add_argument("--profile", nargs="?", const="profile.json", metavar="FILE",
+                        help="write per-stage timings, counts and peak memory as JSON (default: profile.json); memory tracing slows the run down")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        profiler.enable()
+    
     # Usage
-    if len(sys.argv) != 2:
+    if args.directory is None:
         #default directory is "data/"
         if os.path.isdir("data"):
             directory = "data"
@@ -418,88 +707,104 @@ def main():
             print(f"Usage: {sys.argv[0]} <dirname>")
             sys.exit(1)
     else:
-        directory = sys.argv[1]
+        directory = args.directory
         if not os.path.isdir(directory):
             print(f"Could not find directory '{directory}'")
             sys.exit(1)
             
-    # dict of college:data
-    college_data = {}
-    # dict of all available terms in the data
-    all_terms = set()
+    if args.pipeline and not args.terms:
+        print("--pipeline needs the terms to export, given with -t")
+        sys.exit(1)
+    if args.pipeline and args.profile:
+        print("--profile can't time the stages of --pipeline separately, as they overlap")
+        sys.exit(1)
+    colleges = [parse_college_name(c.strip()) for arg in args.college for c in arg.split(',')] if args.college else None
+            
+    # CACHING
+    with profiler.stage('load_cache') as counts:
+        entries = load_file_cache()
+        counts['files'] = len(entries)
+    if args.pipeline:
+        # conversion, parsing, wams and xlsx export all at once, see pipeline.py
+        from pipeline import Pipeline
+        try:
+            pipeline = Pipeline(sys.modules[__name__], directory, entries, args.terms, colleges, args.pdf_backend, args.output_dir, args.write_only, export=args.format == 'xlsx')
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        entries, parsed, cache_error, college_data, all_terms, engines, terms = pipeline.run()
+    else:
+        entries, parsed, cache_error = update_entries(directory, entries, args.pdf_backend)
+    if not parsed:
+        print("CACHED DATA WAS FOUND. PDF file processing skipped.\n")
+        print(f"Please delete {FILE_CACHE} to refresh the cache.\n")
     
-    # last modified times of all files in data dir
-    last_mod_load = []
-    last_mod = []
-    for file in sorted(os.listdir(directory)):
-        if file.endswith(".pdf"):
-            last_mod.append(os.path.getmtime(f'{directory}/{file}'))
+    if not args.pipeline:
+        # dict of college:data, and set of all available terms in the data
+        college_data, all_terms = merge_entries(entries)
+        calculate_wams(college_data)
     
-    #get any cached data
-    cached_dict = f'cache/data.pkl'
-    cache_error = False
+    # results database, refreshed whenever it wasn't saved from this data
+    if args.db:
+        from results_db import ResultsDB
+        with profiler.stage('save_db'), ResultsDB(args.db) as db:
+            fingerprint = data_fingerprint(entries)
+            if db.fingerprint() != fingerprint:
+                db.save(college_data, fingerprint)
     
-    # CACHING
-    # Try to get cached college data
-    try:
-        with open(f'{cached_dict}', 'rb') as f:
-            last_mod_load = pickle.load(f)
-            college_data = pickle.load(f)
-            all_terms = pickle.load(f)
-        
-        # check last modified time of data files, if not same, process and repickle
-        if last_mod_load != last_mod:
-            cache_error = True   
-            raise()
-        
-        print("CACHED DATA WAS FOUND. PDF file processing skipped.\n")
-        print("Please delete cache/data.pkl to refresh the cache.\n")
-    except Exception:
-        cache_error = True
-        # Convert files to txt
-        pdf_to_txt(directory)
-            
-        # Loop through all files in curr dir and get data
-        for file in sorted(os.listdir(directory)):
-            if not file.endswith('.txt'):
-                continue
-            # College name
-            college = file.split()[0]
-            college = parse_college_name(college)
-            
-            # read line by line, generate dict of student objects
-            with open(f"{directory}/{file}", 'r') as fp:
-                print(f"Processing {college}...")                  
-                college_data[college] = parse_lines(fp, college, all_terms)
-                
-    # precalculate all wams
-    for c in college_data:
-        for s in college_data[c]:
-            college_data[c][s].process_wams()
+    # history index, updated whenever it wasn't last updated from this data, only the new or
+    # changed term wams are written
+    if args.history:
+        from history import HistoryIndex
+        with profiler.stage('save_history'), HistoryIndex(args.history) as index:
+            fingerprint = data_fingerprint(entries)
+            if index.fingerprint() != fingerprint:
+                index.update(college_data, fingerprint)
     
-    # User to select term(s)
-    terms = pick_term(all_terms)
-        
-    # process all nominated terms
-    while terms:
-        term = terms.pop(0)
-        
-        term_code = convert_term_name(term)
-        
-        # excel filename
-        filename = "College_Academics_" + term_code + ".xlsx"
-        
-        # Export to excel
-        export_to_excel(filename, college_data, term)
+    # User to select term(s), unless given on the command line, the pipeline has already selected them
+    if args.terms and not args.pipeline:
+        try:
+            terms = select_terms(args.terms, all_terms)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+    elif not args.terms:
+        terms = pick_term(all_terms)
+    
+    # only the nominated colleges
+    export_data_dict = college_data
+    if colleges:
+        missing = [c for c in colleges if c not in college_data]
+        if missing:
+            print(f"No results for college(s): {', '.join(missing)}")
+            sys.exit(1)
+        export_data_dict = {c: college_data[c] for c in college_data if c in colleges}
+    if not args.pipeline:
+        engines = statistics_engines(export_data_dict, len(terms))
         
-        print (f"\nDone. File is located at: {os.getcwd()}/{filename}\n")
+    if args.format == 'parquet' and exporters.import_pyarrow() is None:
+        print("pyarrow is not installed, writing columnar .col files instead of parquet\n")
+    
+    # process all nominated terms, the pipeline has already written the workbooks
+    if args.pipeline and args.format == 'xlsx':
+        filenames = [os.path.join(args.output_dir, export_name(term, colleges) + ".xlsx") for term in terms]
+    else:
+        filenames = export_terms(terms, export_data_dict, engines, args.output_dir, args.jobs, args.write_only, args.format, colleges)
+    for filename in filenames:
+        print (f"\nDone. File is located at: {os.path.abspath(filename)}\n")
+    
+    # wam trends of every college, as statistics.py charts them
+    if args.format != 'xlsx':
+        filename = exporters.export_wams(os.path.join(args.output_dir, "College_Stats"), args.format, college_wam_sums(entries))
+        print (f"Done. File is located at: {os.path.abspath(filename)}\n")
+    
+    if args.profile:
+        profiler.write(args.profile)
+        print(f"Profile written to {os.path.abspath(args.profile)}")
+    
+    if args.pipeline and pipeline.missing:
+        print(f"No results for term(s): {', '.join(pipeline.missing)}")
+        sys.exit(1)
     
-    if not os.path.isfile(cached_dict) or cache_error:
-        os.makedirs('cache/', exist_ok=True)
-        with open(f'cache/data.pkl', 'wb') as f:
-            pickle.dump(last_mod, f)
-            pickle.dump(college_data, f)
-            pickle.dump(all_terms, f)
-            
 if __name__ == "__main__":
     main()
\ No newline at end of file
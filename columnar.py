@@ -0,0 +1,166 @@
+# Versioned columnar binary files, used for the results cache
+# Layout: MAGIC, uint32 format version, uint32 header length, JSON header, then column data
+# aligned to 8 bytes. Columns are typed arrays ('q' int64, 'i' int32, 'd' float64); string
+# columns ('s') are stored as int32 indexes into one string pool per file.
+# Readers memory-map the file and only decode the columns and strings they use.
+
+import os, sys
+import json
+import mmap
+import struct
+from array import array
+
+MAGIC = b'COLACAD\x00'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+NUMERIC_TYPES = ('q', 'i', 'd')
+
+class FormatError(Exception):
+    pass
+
+def align(n):
+    return (n + 7) & ~7
+
+# write tables to path, replacing any existing file
+# tables: {table: {column: (type, values)}}, type one of 'q', 'i', 'd' or 's'
+# schema_version: version of the caller's schema, checked again when reading
+def write_columns(path, tables, schema_version):
+    pool = {}
+    blocks = []
+    header = {'schema_version': schema_version, 'byteorder': sys.byteorder, 'tables': {}}
+    offset = 0
+
+    def add_block(data):
+        nonlocal offset
+        blocks.append((offset, data))
+        start = offset
+        offset = align(offset + len(data))
+        return start
+
+    for table, columns in tables.items():
+        rows = None
+        entry = header['tables'][table] = {'rows': 0, 'columns': {}}
+        for column, (kind, values) in columns.items():
+            if kind == 's':
+                data = array('i', [pool.setdefault(v, len(pool)) for v in values])
+            elif kind in NUMERIC_TYPES:
+                data = array(kind, values)
+            else:
+                raise ValueError(f"Unknown column type '{kind}' for {table}.{column}")
+            if rows is not None and len(data) != rows:
+                raise ValueError(f"Column {table}.{column} has {len(data)} rows, expected {rows}")
+            rows = len(data)
+            data = data.tobytes()
+            entry['columns'][column] = [kind, add_block(data), len(data)]
+        entry['rows'] = rows or 0
+
+    encoded = [s.encode('utf-8') for s in pool]
+    ends = array('q')
+    end = 0
+    for s in encoded:
+        end += len(s)
+        ends.append(end)
+    blob = b''.join(encoded)
+    header['pool'] = [len(encoded), add_block(ends.tobytes()), add_block(blob), len(blob)]
+
+    header = json.dumps(header).encode('utf-8')
+    data_start = align(PREAMBLE.size + len(header))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for (start, data) in blocks:
+            f.seek(data_start + start)
+            f.write(data)
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+class ColumnarFile:
+
+    # schema_version: expected schema version, schema: optional {table: {column: type}} that
+    # must be present in the file. Raises FormatError if the file doesn't match
+    def __init__(self, path, schema_version=None, schema=None):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < PREAMBLE.size:
+                raise FormatError(f"{path} is not a columnar file")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, header_len = PREAMBLE.unpack_from(self.mm)
+            if magic != MAGIC:
+                raise FormatError(f"{path} is not a columnar file")
+            if version != FORMAT_VERSION:
+                raise FormatError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+            try:
+                self.header = json.loads(self.mm[PREAMBLE.size:PREAMBLE.size + header_len])
+            except ValueError:
+                raise FormatError(f"{path} has a corrupt header")
+            if self.header.get('byteorder') != sys.byteorder:
+                raise FormatError(f"{path} was written on a machine with different byte order")
+            if schema_version is not None and self.header.get('schema_version') != schema_version:
+                raise FormatError(f"{path} has schema version {self.header.get('schema_version')}, expected {schema_version}")
+            for table, columns in (schema or {}).items():
+                for column, kind in columns.items():
+                    found = self.header['tables'].get(table, {}).get('columns', {}).get(column)
+                    if not found or found[0] != kind:
+                        raise FormatError(f"{path} is missing column {table}.{column}")
+            self.data_start = align(PREAMBLE.size + header_len)
+            if self.data_start + self._data_size() > size:
+                raise FormatError(f"{path} is truncated")
+        except Exception:
+            self.mm.close()
+            raise
+        self.view = memoryview(self.mm)
+        count, ends_at, self.blob_at, _ = self.header['pool']
+        self.pool_ends = self._block(ends_at, count * 8).cast('q')
+        self.pool = [None] * count
+
+    def _data_size(self):
+        size = 0
+        blocks = [spec[1:] for table in self.header['tables'].values() for spec in table['columns'].values()]
+        count, ends_at, blob_at, blob_len = self.header['pool']
+        blocks += [(ends_at, count * 8), (blob_at, blob_len)]
+        for (start, length) in blocks:
+            size = max(size, start + length)
+        return size
+
+    def _block(self, start, length):
+        return self.view[self.data_start + start:self.data_start + start + length]
+
+    def rows(self, table):
+        return self.header['tables'][table]['rows']
+
+    # memoryview of a numeric column (or of the pool indexes of a string column), no copying
+    def column(self, table, column):
+        kind, start, length = self.header['tables'][table]['columns'][column]
+        return self._block(start, length).cast('i' if kind == 's' else kind)
+
+    # string from the pool, decoded on first use
+    def string(self, i):
+        s = self.pool[i]
+        if s is None:
+            start = self.pool_ends[i - 1] if i else 0
+            s = self.pool[i] = str(self._block(self.blob_at + start, self.pool_ends[i] - start), 'utf-8')
+        return s
+
+    # list of the values of a string column
+    def strings(self, table, column):
+        string = self.string
+        return [string(i) for i in self.column(table, column)]
+
+    # views returned by column() must be released (or dropped) first,
+    # otherwise the mapping is left for the garbage collector to close
+    def close(self):
+        try:
+            self.pool_ends.release()
+            self.view.release()
+            self.mm.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
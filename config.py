@@ -1,6 +1,32 @@
 # Variables, constants, and Classes for college_academics.py
 
-import re
+import os, sys
+from functools import lru_cache
+
+#PROCESSING
+# number of pdftotext conversions to run at once
+pdf_workers = os.cpu_count() or 1
+# number of processes used to parse transcript files, 1 parses in the main process
+parse_workers = os.cpu_count() or 1
+# how pdfs are turned into text (see extract.py): 'pdftotext' or 'pypdf' extract in memory,
+# 'file' writes a txt file next to each pdf with pdftotext and parses that
+pdf_backend = 'pdftotext'
+# pages per chunk when a pdf is split across workers
+pdf_chunk_pages = 50
+# write workbooks in openpyxl's streaming write-only mode (replaces the whole file each export)
+excel_write_only = False
+# items each queue between stages of the --pipeline run holds before the stage before it waits
+pipeline_queue_size = 4
+# fewest terms exported in one run for the numpy statistics engine (wam_engine.py) to be used,
+# building it for a college costs about as much as this many terms of get_statistics
+engine_min_terms = 16
+
+#SERVICE
+# default address of service.py, and seconds between checks of the data directory for changes
+service_host = '127.0.0.1'
+service_port = 8080
+service_poll_seconds = 5
+
 #FORMAT
 # colours for excel sheet tabs
 college_colours = {
@@ -40,60 +66,146 @@ col_widths = {
     "WAM" : 6
 }
 
-# Function to convert short code to term name or vice versa
-def convert_term_name(term_string):
-    term_string = term_string.strip()
+#GRADES
+# grade names (upper case) counted as a high distinction or a fail in statistics and highlighted in excel
+HD_GRADE = "HIGH DISTINCTION"
+FAIL_GRADES = ("FAIL", "ABSENT FAIL", "UNSATISFACTORY FAIL", "ACADEMIC WITHDRAWAL")
+
+#TERMS
+# term kind by code letter and code letter by kind, term number 0 is the summer term
+TERM_KINDS = {'T': 'TERM', 'S': 'SEMESTER'}
+TERM_LETTERS = {kind: letter for (letter, kind) in TERM_KINDS.items()}
+TERM_NUMBERS = ('0', '1', '2', '3')
+
+# A term from either its name as in transcripts ("2022 TERM 3") or its short code ("22T3").
+# Term.get works out the code of a string with table lookups, and returns the one Term kept
+# for that code, so a name and its code give the same Term. Terms are equal when their year,
+# kind and number are, which their code is made of
+class Term:
+    __slots__ = ('name', 'code', 'key')
     
-    # return None if not matching term code pattern
-    if re.match("(?i)^\d\d[ST][0123]$", term_string) is not None:
-        term_code = term_string
-        
-        # get year, term/sem, and term/sem number
-        year = term_code[:1]
-        year = "20" + year
-        
-        if term_code[2].upper() == "S":
-            term_sem = "SEMESTER"
+    # code: a short code as Term.code gives, e.g. 22T3, use Term.get
+    def __init__(self, code):
+        year, letter, number = code[:2], code[2], code[3]
+        if number == "0":
+            self.name = sys.intern(f"20{year} SUMMER {TERM_KINDS[letter]}")
         else:
-            term_sem = "TERM"
+            self.name = sys.intern(f"20{year} {TERM_KINDS[letter]} {number}")
+        self.code = sys.intern(code)
+        # chronological order, summer terms before term/semester 1 of their year
+        self.key = (int(year), int(number))
+    
+    # Term for a name or code, None if it isn't one
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def get(term_string):
+        code = Term.parse(term_string)
+        return None if code is None else Term.of_code(code)
+    
+    # the only Term for a code. Never evicted (a century of terms is 800 codes), so the same
+    # Term comes back however often get's cache is turned over
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of_code(code):
+        return Term(code)
+    
+    # short code of a name or code, e.g. 22T3 for 2022 TERM 3 or 22t3, None if it isn't one
+    @staticmethod
+    def parse(term_string):
+        term_string = term_string.strip()
         
-        if term_code[-1] == "0":
-            return f"{year} SUMMER {term_sem}"
+        # short code, e.g. 22T3 or 22S0
+        if len(term_string) == 4:
+            year, letter, number = term_string[:2], term_string[2].upper(), term_string[3]
+            if year.isdecimal() and letter in TERM_KINDS and number in TERM_NUMBERS:
+                return year + letter + number
+            return None
         
-        return f"{year} {term_sem} {term_code[-1]}"
-    
-    elif re.match("(?i)^\d{4} (?:TERM|SEMESTER) [0123]$", term_string) is not None or \
-         re.match("(?i)^\d{4} SUMMER (?:TERM|SEMESTER)$", term_string) is not None:
-        #convert to short code
-        term_split = re.split(' ', term_string)
-        if term_split[1].lower() == "summer":
-            term_split[1] = "0"
-            term_split.append(term_split.pop(1)) #move to end
-            
-        return term_split[0][-2:] + term_split[1][0].upper() + term_split[2]
+        # name, e.g. 2022 TERM 3 or 2022 SUMMER TERM
+        term_split = term_string.split(' ')
+        if len(term_split) != 3 or len(term_split[0]) != 4 or not term_split[0].isdecimal():
+            return None
+        year, first, last = term_split[0][-2:], term_split[1].upper(), term_split[2].upper()
+        if first in TERM_LETTERS and last in TERM_NUMBERS:
+            return year + TERM_LETTERS[first] + last
+        if first == "SUMMER" and last in TERM_LETTERS:
+            return year + TERM_LETTERS[last] + "0"
+        return None
+    
+    # (year, kind, number), e.g. (22, 'T', 3)
+    def parts(self):
+        return (self.key[0], self.code[2], self.key[1])
+    
+    def __eq__(self, other):
+        if not isinstance(other, Term):
+            return NotImplemented
+        return self.parts() == other.parts()
     
-    return None
+    def __hash__(self):
+        return hash(self.parts())
+    
+    def __repr__(self):
+        return f'Term({self.name}, {self.code})'
+
+# Function to convert short code to term name or vice versa, None if not a term
+@lru_cache(maxsize=4096)
+def convert_term_name(term_string):
+    term = Term.get(term_string)
+    if term is None:
+        return None
+    return term.name if len(term_string.strip()) == 4 else term.code
 
-#OBJECTS                
+# chronological sort key for a term name, summer terms sort before term/semester 1 of their year
+def term_sort_key(term_string):
+    term = Term.get(term_string)
+    if term is None:
+        return (0, 0, term_string)
+    return term.key + (term_string,)
+
+#OBJECTS
+# Course and Student use __slots__ and pickle as plain tuples to keep big datasets small.
+# Marks are stored as ints (None if ungraded) and wams as floats rounded to 1 decimal place,
+# repeated strings (course codes/names, grade names, terms) are interned
 class Course:
+    __slots__ = ('code', 'name', 'mark', 'grade_name')
+    
     def __init__(self, code_name, code_num, name, grade='-', grade_name='-'):
-        self.code = code_name + code_num
-        self.name = name
-        self.grade = grade
-        self.grade_name = grade_name
+        self.code = sys.intern(code_name + code_num)
+        self.name = sys.intern(name)
+        self.mark = int(grade) if grade.isnumeric() else None
+        self.grade_name = sys.intern(grade_name)
+    
+    # mark as a string, '' if ungraded
+    @property
+    def grade(self):
+        return '' if self.mark is None else str(self.mark)
     
     def hasGrade(self):
-        return self.grade.isnumeric()
+        return self.mark is not None
+    
+    # (code, name, grade, grade_name) as strings, in excel column order
+    def values(self):
+        return (self.code, self.name, self.grade, self.grade_name)
+    
+    def __getstate__(self):
+        return (self.code, self.name, self.mark, self.grade_name)
+    
+    def __setstate__(self, state):
+        self.code, self.name, self.mark, self.grade_name = state
         
     def __repr__(self):
         return f'Course({self.code}, {self.name}, {self.grade}, {self.grade_name})'
 
 class Student:
+    __slots__ = ('first_names', 'last_name', 'zid', 'college', 'enrol_type', 'program', 'terms', 'wams', 'overall_wam')
+    # attributes printed before the term columns in excel, in column order
+    info_fields = ('first_names', 'last_name', 'zid', 'college', 'enrol_type', 'program')
+    
     def __init__(self, name, zid, college, enrol_type='', program=''):
         self.first_names = self.splitName(name)[0].title()
         self.last_name = self.splitName(name)[1]
         self.zid = zid
-        self.college = college
+        self.college = sys.intern(college)
         self.enrol_type = enrol_type.title() #UGRD/PGRD
         self.program = program
         self.terms = {}
@@ -113,6 +225,10 @@ class Student:
         last_name = name.split()[-1]
         return (first_names, last_name)
     
+    # values of info_fields, in excel column order
+    def info(self):
+        return (self.first_names, self.last_name, self.zid, self.college, self.enrol_type, self.program)
+    
     #calculate and return WAM
     def calc_wam(self, select_term):
         if select_term in self.terms.keys():
@@ -120,11 +236,11 @@ class Student:
             counter = 0
             total = 0
             for course in courses:
-                if course.hasGrade():
+                if course.mark is not None:
                     counter += 1
-                    total += float(course.grade)
+                    total += course.mark
             if counter:
-                return f'{total/counter:.1f}'
+                return round(total/counter, 1)
             else:
                 return None
     
@@ -136,11 +252,17 @@ class Student:
             w = self.calc_wam(t)
             self.wams[t] = w
             if w is not None:
-                total += float(w)
+                total += w
         
         if self.wams:           
-            self.overall_wam = f'{total / sum(_ is not None for _ in self.wams):.1f}'
+            self.overall_wam = round(total / sum(_ is not None for _ in self.wams), 1)
+    
+    def __getstate__(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+    
+    def __setstate__(self, state):
+        for attr, val in zip(self.__slots__, state):
+            setattr(self, attr, val)
             
     def __repr__ (self):
         return f'Student( {self.first_names+" "+self.last_name}, {self.zid}, {self.enrol_type}, {self.program}, {self.wams}, {self.overall_wam}, \n{self.terms} )\n\n'
-  
\ No newline at end of file
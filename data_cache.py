@@ -0,0 +1,298 @@
+# Per-file incremental cache for college_academics.py
+# Each source file (pdf, or a txt with no pdf) is keyed on (path, size, mtime, content hash)
+# so only new or changed files need to be converted and parsed again.
+# The cache is a versioned columnar file (see columnar.py) with one table per level of the
+# data, so consumers like statistics.py can read just the columns they need
+
+import os
+import math
+import hashlib
+from collections.abc import Mapping
+from config import *
+from columnar import ColumnarFile, FormatError, write_columns
+
+CACHE_DIR = 'cache'
+FILE_CACHE = f'{CACHE_DIR}/data.col'
+# caches from before the columnar format
+OLD_CACHES = (f'{CACHE_DIR}/data.pkl', f'{CACHE_DIR}/files.pkl')
+# bump when SCHEMA or the meaning of a column changes
+CACHE_VERSION = 5
+
+# key for the all colleges totals in college_wams
+ALL = "ALL"
+
+# columns of each table and their types ('s' string, 'i'/'q' int, 'd' float)
+# rows reference rows of the table above them by index
+SCHEMA = {
+    'files': {'path': 's', 'size': 'q', 'mtime': 'd', 'digest': 's', 'college': 's'},
+    'file_terms': {'file': 'i', 'term': 's'},
+    # columns after file are in Student.info_fields order
+    'students': {'file': 'i', 'first_names': 's', 'last_name': 's', 'zid': 's', 'college': 's',
+                 'enrol_type': 's', 'program': 's'},
+    # one row per (student, term), wam is NaN if the term has no graded courses
+    'enrolments': {'student': 'i', 'college': 's', 'term': 's', 'wam': 'd'},
+    # mark is -1 if ungraded
+    'courses': {'enrolment': 'i', 'code': 's', 'name': 's', 'mark': 'i', 'grade_name': 's'},
+    # wam sums of each file's students per term, see wam_sums
+    'file_wams': {'file': 'i', 'term': 's', 'total': 'q', 'count': 'i'},
+    # the same sums over all files, each student counted once, plus ALL
+    'college_wams': {'college': 's', 'term': 's', 'total': 'q', 'count': 'i'},
+}
+
+class FileEntry:
+    def __init__(self, path, size, mtime, digest, college, students, terms, sums=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.digest = digest
+        self.college = college
+        self.students = students  # dict of zid:Student parsed from this file
+        self.terms = terms        # set of term names seen in this file
+        # {term: [total, count]} wam sums of the students, worked out once when the file is parsed
+        self.sums = wam_sums(students.values()) if sums is None else sums
+
+    def __repr__(self):
+        return f'FileEntry({self.path}, {self.college}, {len(self.students)} students)'
+
+# add the term wams of students to sums, {term: [total, count]}, sign -1 to take them away
+# every term wam is counted, 0.0 included, only terms with nothing graded (None) are left
+# out. Totals are kept in tenths of a mark so they add up exactly in any order
+def wam_sums(students, sums=None, sign=1):
+    if sums is None:
+        sums = {}
+    for student in students:
+        for term in student.terms:
+            agg = sums.get(term)
+            if agg is None:
+                agg = sums[term] = [0, 0]
+            wam = student.calc_wam(term)
+            if wam is not None:
+                agg[0] += sign * round(wam * 10)
+                agg[1] += sign
+    return sums
+
+# add sums to totals, {term: [total, count]}
+def add_sums(totals, sums):
+    for term, (total, count) in sums.items():
+        agg = totals.get(term)
+        if agg is None:
+            agg = totals[term] = [0, 0]
+        agg[0] += total
+        agg[1] += count
+
+# {college: {term: [total, count]}} over all entries, plus ALL, with each student counted
+# once as in merge_entries and export_to_excel: the last entry for a zid in a college, and
+# for ALL the one from the last college. Only the per-file sums are added up, wams are
+# only worked out again for students that appear more than once
+def college_wam_sums(entries):
+    totals = {}
+    seen = {}
+    for path in sorted(entries, key=txt_path):
+        entry = entries[path]
+        add_sums(totals.setdefault(entry.college, {}), entry.sums)
+        college_seen = seen.setdefault(entry.college, {})
+        for zid, student in entry.students.items():
+            old = college_seen.get(zid)
+            if old is not None:
+                wam_sums([old], totals[entry.college], -1)
+            college_seen[zid] = student
+
+    totals[ALL] = {}
+    last = {}
+    for college, students in seen.items():
+        add_sums(totals[ALL], totals[college])
+        for zid, student in students.items():
+            old = last.get(zid)
+            if old is not None:
+                wam_sums([old], totals[ALL], -1)
+            last[zid] = student
+    return totals
+
+# sha1 of file contents, read in blocks
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# sha1 of the cache version and every entry's path and digest, changes whenever the data
+# merge_entries makes from entries would, for stores kept from it (results_db.py)
+def data_fingerprint(entries):
+    h = hashlib.sha1(f"{CACHE_VERSION}".encode())
+    for path in sorted(entries, key=txt_path):
+        h.update(f"\0{path}\0{entries[path].digest}".encode())
+    return h.hexdigest()
+
+# list of source files in directory: every pdf, plus any txt without a matching pdf
+def source_files(directory):
+    files = sorted(os.listdir(directory))
+    pdfs = {file[:-4] for file in files if file.endswith('.pdf')}
+    sources = []
+    for file in files:
+        if file.endswith('.pdf') or (file.endswith('.txt') and file[:-4] not in pdfs):
+            sources.append(f'{directory}/{file}')
+    return sources
+
+# text file the parser reads for a source file
+def txt_path(path):
+    return path[:-4] + '.txt'
+
+# open the cache for reading columns, raises FormatError if it is missing, old or doesn't match SCHEMA
+def open_cache(filename=FILE_CACHE):
+    if not os.path.isfile(filename):
+        if any(os.path.isfile(old) for old in OLD_CACHES):
+            raise FormatError(f"{filename} not found, the cache is in an old format")
+        raise FormatError(f"{filename} not found")
+    return ColumnarFile(filename, CACHE_VERSION, SCHEMA)
+
+# load cached entries as a dict of path:FileEntry, empty if missing, unreadable or old version
+def load_file_cache(filename=FILE_CACHE):
+    try:
+        cache = open_cache(filename)
+    except (OSError, FormatError):
+        return {}
+    with cache:
+        return read_entries(cache)
+
+def read_entries(cache):
+    col = lambda table, column: cache.column(table, column).tolist()
+    string = cache.string
+
+    entries = {}
+    files = []
+    for (path, size, mtime, digest, college) in zip(*(col('files', c) for c in SCHEMA['files'])):
+        entry = FileEntry(string(path), size, mtime, string(digest), string(college), {}, set(), {})
+        entries[entry.path] = entry
+        files.append(entry)
+    for (file, term) in zip(col('file_terms', 'file'), col('file_terms', 'term')):
+        files[file].terms.add(string(term))
+
+    students = []
+    for (file, *info) in zip(*(col('students', c) for c in SCHEMA['students'])):
+        student = Student.__new__(Student)
+        student.__setstate__([string(i) for i in info] + [{}, {}, None])
+        files[file].students[student.zid] = student
+        students.append(student)
+
+    enrolments = []
+    for (student, term) in zip(col('enrolments', 'student'), col('enrolments', 'term')):
+        courses = students[student].terms[string(term)] = []
+        enrolments.append(courses)
+
+    for (enrolment, code, name, mark, grade_name) in zip(*(col('courses', c) for c in SCHEMA['courses'])):
+        course = Course.__new__(Course)
+        course.__setstate__((string(code), string(name), None if mark < 0 else mark, string(grade_name)))
+        enrolments[enrolment].append(course)
+
+    for (file, term, total, count) in zip(*(col('file_wams', c) for c in SCHEMA['file_wams'])):
+        files[file].sums[string(term)] = [total, count]
+    return entries
+
+# {college: {term: (total, count)}} from the college_wams table of an open cache
+def read_college_wams(cache):
+    string = cache.string
+    totals = {}
+    for (college, term, total, count) in zip(*(cache.column('college_wams', c).tolist() for c in SCHEMA['college_wams'])):
+        totals.setdefault(string(college), {})[string(term)] = (total, count)
+    return totals
+
+def save_file_cache(entries, filename=FILE_CACHE):
+    tables = {table: {column: (kind, []) for column, kind in columns.items()} for table, columns in SCHEMA.items()}
+    def add(table, *values):
+        for (kind, column), value in zip(tables[table].values(), values):
+            column.append(value)
+
+    for file, entry in enumerate(entries.values()):
+        add('files', entry.path, entry.size, entry.mtime, entry.digest, entry.college)
+        for term in sorted(entry.terms):
+            add('file_terms', file, term)
+        for student in entry.students.values():
+            s = len(tables['students']['zid'][1])
+            add('students', file, *student.info())
+            for term, courses in student.terms.items():
+                e = len(tables['enrolments']['term'][1])
+                wam = student.calc_wam(term)
+                add('enrolments', s, student.college, term, math.nan if wam is None else wam)
+                for course in courses:
+                    add('courses', e, course.code, course.name, -1 if course.mark is None else course.mark, course.grade_name)
+        for term, (total, count) in entry.sums.items():
+            add('file_wams', file, term, total, count)
+    for college, sums in college_wam_sums(entries).items():
+        for term, (total, count) in sums.items():
+            add('college_wams', college, term, total, count)
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    write_columns(filename, tables, CACHE_VERSION)
+    # the pickles the columnar cache replaced are never read again
+    if filename == FILE_CACHE:
+        for old in OLD_CACHES:
+            if os.path.isfile(old):
+                os.remove(old)
+
+# compare cached entries against the source files in directory
+# returns (entries, stale, dirty): entries for unchanged files (deleted files evicted), a list
+# of (path, size, mtime, digest) for new or changed files that need to be parsed, and whether
+# the kept entries differ from the cached ones (evictions or refreshed mtimes)
+def check_sources(directory, entries):
+    fresh = {}
+    stale = []
+    dirty = False
+    for path in source_files(directory):
+        st = os.stat(path)
+        entry = entries.get(path)
+        if entry and entry.size == st.st_size and entry.mtime == st.st_mtime:
+            fresh[path] = entry
+            continue
+        digest = file_digest(path)
+        if entry and entry.size == st.st_size and entry.digest == digest:
+            # touched but unchanged
+            entry.mtime = st.st_mtime
+            fresh[path] = entry
+            dirty = True
+            continue
+        stale.append((path, st.st_size, st.st_mtime, digest))
+    if set(entries) - set(fresh) - {path for (path, *_) in stale}:
+        dirty = True
+    return fresh, stale, dirty
+
+# merge cached entries into (college_data, all_terms), in source file order
+def merge_entries(entries):
+    college_data = {}
+    all_terms = set()
+    for path in sorted(entries, key=txt_path):
+        entry = entries[path]
+        college_data.setdefault(entry.college, {}).update(entry.students)
+        all_terms |= entry.terms
+    return college_data, all_terms
+
+# Read-only view of several zid:Student dicts as one, e.g. every college for the ALL sheet,
+# without copying them. Looks the same as a dict built by updating an empty dict with each
+# in turn: a zid is in the position it first appears, with the student from the last dict
+# it is in. Changes to the dicts show through
+class MergedView(Mapping):
+
+    def __init__(self, mappings):
+        self.mappings = list(mappings)
+
+    def __getitem__(self, zid):
+        for students in reversed(self.mappings):
+            if zid in students:
+                return students[zid]
+        raise KeyError(zid)
+
+    def __contains__(self, zid):
+        return any(zid in students for students in self.mappings)
+
+    def __iter__(self):
+        for i, students in enumerate(self.mappings):
+            earlier = self.mappings[:i]
+            for zid in students:
+                if not any(zid in other for other in earlier):
+                    yield zid
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"MergedView({len(self.mappings)} mappings, {len(self)} students)"
@@ -0,0 +1,207 @@
+# Flat file exporters for college_academics.py, for data tooling rather than people
+# Each table is written to its own file, <base>.<table>.<extension>, one record per row:
+#   students: a row per course each student took in the term (or one row with no course if
+#             they took none or weren't enrolled), the same rows export_data puts in a sheet
+#   stats: get_statistics results, a row per average, high performer and underperformer course
+#   wams: the per college wam trend College_Stats.xlsx is drawn from (statistics.College)
+# Formats:
+#   csv, jsonl: streamed a row at a time
+#   parquet: with the optional pyarrow library, in row batches; without it the tables are
+#            written as columnar.py files (.col), which need nothing outside this repo
+# Terms are written as names, as in the students sheets (e.g. "2019 Term 1")
+# Columnar files have no nulls: None is written as NaN in float columns, '' in string
+# columns and 0 in integer columns
+
+import csv
+import json
+from config import *
+from columnar import write_columns
+
+# pyarrow is optional and slow to import, so it is only looked for when parquet is written
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+# bump when a table's columns change, saved in columnar files
+EXPORT_VERSION = 1
+
+# columns of each table, with columnar.py types ('i' int32, 'd' float64, 's' string)
+STUDENT_COLUMNS = {field: 's' for field in Student.info_fields}
+STUDENT_COLUMNS.update({'term': 's', 'wam': 'd', 'code': 's', 'course': 's', 'mark': 'd', 'grade_name': 's'})
+
+STATS_COLUMNS = {
+    'college': 's', 'term': 's', 'category': 's', 'zid': 's', 'name': 's', 'wam': 'd',
+    'subject': 's', 'mark': 'd', 'grade_name': 's', 'hd_count': 'i', 'course_count': 'i',
+}
+
+WAM_COLUMNS = {'college': 's', 'term': 's', 'total': 'd', 'students': 'i', 'wam': 'd'}
+
+# number of rows per parquet row group
+BATCH_ROWS = 10000
+
+class CsvWriter:
+    extension = '.csv'
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class JsonlWriter:
+    extension = '.jsonl'
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.columns = list(columns)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False))
+            self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    extension = '.parquet'
+    types = {'s': 'string', 'd': 'float64', 'i': 'int32'}
+
+    def __init__(self, path, columns):
+        self.pyarrow = import_pyarrow()
+        self.schema = self.pyarrow.schema([(name, self.types[kind]) for (name, kind) in columns.items()])
+        self.writer = self.pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch = []
+
+    def write(self, rows):
+        for row in rows:
+            self.batch.append(row)
+            if len(self.batch) >= BATCH_ROWS:
+                self.flush()
+
+    def flush(self):
+        if self.batch:
+            columns = [list(column) for column in zip(*self.batch)]
+            self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+# parquet without pyarrow: columns are kept in memory and written when the table is closed
+class ColumnarWriter:
+    extension = '.col'
+    nulls = {'s': '', 'd': float('nan'), 'i': 0}
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = {name: (kind, []) for (name, kind) in columns.items()}
+
+    def write(self, rows):
+        columns = list(self.columns.values())
+        for row in rows:
+            for (kind, values), value in zip(columns, row):
+                values.append(self.nulls[kind] if value is None else value)
+
+    def close(self):
+        write_columns(self.path, {'rows': self.columns}, EXPORT_VERSION)
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+def writer_class(fmt):
+    if fmt == 'csv':
+        return CsvWriter
+    if fmt == 'jsonl':
+        return JsonlWriter
+    if fmt == 'parquet':
+        return ParquetWriter if import_pyarrow() is not None else ColumnarWriter
+    raise ValueError(f"Unknown export format '{fmt}'")
+
+# write rows to <base>.<table>.<extension>, returns the file's path
+def write_table(base, table, fmt, columns, rows):
+    cls = writer_class(fmt)
+    path = f"{base}.{table}{cls.extension}"
+    writer = cls(path, columns)
+    try:
+        writer.write(rows)
+    finally:
+        writer.close()
+    return path
+
+# Rows of the students table for one college, like data_rows without the sheet layout
+def student_records(students_dict, term):
+    empty = (None,) * 6
+    for student in students_dict.values():
+        info = student.info()
+        courses = student.terms.get(term)
+        if courses is None:
+            yield info + empty
+            continue
+        start = info + (term.title(), student.wams[term])
+        if not courses:
+            yield start + (None,) * 4
+        for course in courses:
+            yield start + (course.code, course.name, course.mark, course.grade_name)
+
+# Rows of the stats table for one college, from the (college_stats, high_perf, under_perf)
+# tuple get_statistics returns, like stats_rows
+def stats_records(college, students_dict, term, college_stats, high_perf, under_perf):
+    def record(category, zid=None, wam=None, subject=None, mark=None, grade_name=None, hd_count=None, course_count=None):
+        name = None
+        if zid is not None:
+            name = students_dict[zid].first_names + ' ' + students_dict[zid].last_name
+        return (college, term.title(), category, zid, name, wam, subject, mark, grade_name, hd_count, course_count)
+
+    yield record('avg_wam', wam=college_stats["avg_wam"])
+    if college_stats["avg_wam"] is None:
+        return
+    for (zid, wam) in high_perf['top_wam']:
+        yield record('top_wam', zid, wam=wam)
+    for (zid, subject, mark) in high_perf['top_sub']:
+        yield record('top_sub', zid, subject=subject, mark=mark)
+    for (zid, hd_count, course_count) in high_perf['full_hd']:
+        yield record('full_hd', zid, hd_count=hd_count, course_count=course_count)
+    for zid, courses in under_perf.items():
+        wam = students_dict[zid].wams[term]
+        for course in courses:
+            yield record('under_perf', zid, wam=wam, subject=course.code + ' ' + course.name,
+                         mark=course.mark, grade_name=course.grade_name)
+
+# Export a term's students and stats tables, base is the path without an extension
+# college_data: dict of college:students dict, without ALL
+# stats: dict of college:get_statistics result for the term
+# returns list of paths written
+def export_term_tables(base, fmt, college_data, term, stats):
+    def students():
+        for students_dict in college_data.values():
+            yield from student_records(students_dict, term)
+
+    def stats_table():
+        for college, students_dict in college_data.items():
+            yield from stats_records(college, students_dict, term, *stats[college])
+
+    return [write_table(base, 'students', fmt, STUDENT_COLUMNS, students()),
+            write_table(base, 'stats', fmt, STATS_COLUMNS, stats_table())]
+
+# Rows of the wams table from {college: {term: (total, count)}} sums such as
+# data_cache.college_wam_sums gives, totals in tenths of a mark. wam is the trend
+# College_Stats.xlsx plots, None for terms with 10 or fewer residents as statistics.College
+def wam_records(sums):
+    for college, terms in sums.items():
+        for term in sorted(terms, key=term_sort_key):
+            total, count = terms[term]
+            wam = total / 10 / count if count > 10 else None
+            yield (college, term.title(), total / 10, count, wam or None)
+
+def export_wams(base, fmt, sums):
+    return write_table(base, 'wams', fmt, WAM_COLUMNS, wam_records(sums))
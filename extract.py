@@ -0,0 +1,146 @@
+# PDF text extraction backends for college_academics.py
+# A backend turns a pdf into pdftotext -layout style text in memory, so it can be parsed
+# straight away instead of being written to a txt file and read back. Pdfs are split into
+# page ranges that are extracted in parallel and joined back together in page order, so one
+# big college pdf can use every core.
+#   pdftotext: the pdftotext binary, one process per page range, text read from its stdout
+#   pypdf: in-process with the optional pypdf library, falls back to pdftotext for a pdf it
+#          can't read or if pypdf isn't installed
+
+from itertools import repeat
+from config import *
+
+# pypdf is optional and slow to import, so it is only looked for when the backend is used
+def import_pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        return None
+    return pypdf
+
+class ExtractError(Exception):
+    pass
+
+class Pdftotext:
+    # the work happens in pdftotext processes, threads are enough to run them in parallel
+    def executor(self, max_workers):
+        from concurrent.futures import ThreadPoolExecutor
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    def available(self):
+        return True
+
+    # number of pages from pdfinfo (installed with pdftotext), None if unknown
+    def page_count(self, path):
+        import subprocess
+        try:
+            result = subprocess.run(["pdfinfo", path], check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        for line in result.stdout.decode(errors='replace').splitlines():
+            if line.startswith("Pages:"):
+                return int(line.split()[1])
+        return None
+
+    # text of pages first to last (1 based, inclusive), or of the whole pdf
+    def extract(self, path, first=None, last=None):
+        import subprocess
+        args = ["pdftotext", "-layout", "-enc", "UTF-8"]
+        if first is not None:
+            args += ["-f", str(first), "-l", str(last)]
+        try:
+            result = subprocess.run(args + [path, "-"], check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            raise ExtractError(e.stderr.decode(errors='replace').strip() or f"exit status {e.returncode}")
+        except OSError as e:
+            raise ExtractError(str(e))
+        return result.stdout.decode('utf-8', errors='replace')
+
+class Pypdf:
+    # pure python, so page ranges need processes to run on more than one core
+    def executor(self, max_workers):
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=max_workers)
+
+    def available(self):
+        return import_pypdf() is not None
+
+    def page_count(self, path):
+        try:
+            return len(import_pypdf().PdfReader(path).pages)
+        except Exception as e:
+            raise ExtractError(str(e))
+
+    # layout mode text of each page, ended with a form feed like pdftotext
+    def extract(self, path, first=None, last=None):
+        try:
+            pages = import_pypdf().PdfReader(path).pages
+            if first is not None:
+                pages = pages[first - 1:last]
+            return ''.join(page.extract_text(extraction_mode="layout") + '\f' for page in pages)
+        except Exception as e:
+            raise ExtractError(str(e))
+
+BACKENDS = {'pdftotext': Pdftotext(), 'pypdf': Pypdf()}
+
+# (first, last) page ranges of up to chunk_pages pages covering pages 1 to n
+def page_ranges(n, chunk_pages):
+    return [(first, min(first + chunk_pages - 1, n)) for first in range(1, n + 1, chunk_pages)]
+
+# module level so it can run in a worker process
+def extract_range(backend, path, first, last):
+    return BACKENDS[backend].extract(path, first, last)
+
+# text of a pdf with one backend, in page ranges of chunk_pages run on up to workers workers
+def extract_text(path, backend='pdftotext', workers=pdf_workers, chunk_pages=pdf_chunk_pages):
+    impl = BACKENDS[backend]
+    n = impl.page_count(path)
+    ranges = page_ranges(n, chunk_pages) if n else [(None, None)]
+    workers = min(workers, len(ranges))
+    if workers <= 1:
+        return ''.join(extract_range(backend, path, first, last) for (first, last) in ranges)
+    with impl.executor(max_workers=workers) as pool:
+        return ''.join(pool.map(extract_range, repeat(backend), repeat(path), *zip(*ranges)))
+
+# text of several pdfs, with the page ranges of every pdf sharing one pool of workers
+# a pdf the backend can't read (or every pdf, if it isn't installed) is done with pdftotext
+# returns dict of path:(text, name of the backend used), or path:(None, error message)
+def extract_pdfs(paths, backend='pdftotext', workers=pdf_workers, chunk_pages=pdf_chunk_pages):
+    if not BACKENDS[backend].available():
+        print(f"{backend} is not installed, using pdftotext")
+        backend = 'pdftotext'
+    impl = BACKENDS[backend]
+
+    errors = {}
+    jobs = []   # (path, first page, last page)
+    for path in paths:
+        try:
+            n = impl.page_count(path)
+        except ExtractError as e:
+            errors[path] = str(e)
+            continue
+        jobs += [(path, first, last) for (first, last) in (page_ranges(n, chunk_pages) if n else [(None, None)])]
+
+    chunks = {}
+    if jobs:
+        with impl.executor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+            futures = [(path, pool.submit(extract_range, backend, path, first, last)) for (path, first, last) in jobs]
+            for (path, future) in futures:
+                try:
+                    chunks.setdefault(path, []).append(future.result())
+                except ExtractError as e:
+                    errors.setdefault(path, str(e))
+
+    results = {}
+    for path in paths:
+        if path not in errors:
+            results[path] = (''.join(chunks[path]), backend)
+        elif backend != 'pdftotext':
+            print(f"{backend} could not read {path} ({errors[path]}), using pdftotext")
+            try:
+                results[path] = (extract_text(path, 'pdftotext', workers, chunk_pages), 'pdftotext')
+            except ExtractError as e:
+                results[path] = (None, str(e))
+        else:
+            results[path] = (None, errors[path])
+    return results
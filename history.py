@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# Persistent per-zid history index for college_academics.py --history
+# Keeps every term wam of every zid across colleges and data drops in SQLite, so a student can
+# be followed from term to term without reprocessing the transcripts. Each update only writes
+# the (zid, term) wams that are new or changed, and triggers keep each zid's running wam total
+# and term count up to date, so their overall wam is one row lookup. Terms missing from a later
+# data drop keep their stored wams.
+# Wams are stored in tenths of a mark like data_cache.wam_sums, so the running sums are exact.
+# A student's previous term is their latest earlier term with a wam, in term_sort_key order
+# usage: history.py [--db FILE] trend ZID | drops [-t TERM] [-c COLLEGE] [-k 10]
+#                                         | under [-t TERM] [-c COLLEGE] [--below 60]
+
+import os, sys
+import argparse
+from config import *
+from sqlite_store import SQLiteStore, META_SCHEMA
+from data_cache import MergedView
+from ranking import top_k
+
+HISTORY_DB = 'cache/history.db'
+
+# bump when the tables change, stored as the database's user_version
+HISTORY_VERSION = 3
+
+# running sums for overall wams: every term is counted, as Student.process_wams divides the
+# total of the term wams by the number of terms, graded or not
+TRIGGERS = """
+CREATE TRIGGER terms_insert AFTER INSERT ON terms BEGIN
+    UPDATE students SET wam_total = wam_total + coalesce(NEW.wam, 0), term_count = term_count + 1 WHERE zid = NEW.zid;
+END;
+CREATE TRIGGER terms_update AFTER UPDATE OF wam ON terms BEGIN
+    UPDATE students SET wam_total = wam_total - coalesce(OLD.wam, 0) + coalesce(NEW.wam, 0) WHERE zid = NEW.zid;
+END;
+"""
+
+SCHEMA = """
+CREATE TABLE students (
+    zid TEXT PRIMARY KEY,
+    first_names TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    college TEXT NOT NULL,
+    wam_total INTEGER NOT NULL DEFAULT 0,
+    term_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE terms (
+    zid TEXT NOT NULL REFERENCES students(zid),
+    term TEXT NOT NULL,
+    term_key INTEGER NOT NULL,
+    college TEXT NOT NULL,
+    wam INTEGER,
+    PRIMARY KEY (zid, term)
+) WITHOUT ROWID;
+CREATE INDEX terms_order ON terms(zid, term_key, term);
+CREATE INDEX terms_term ON terms(term, wam);
+""" + TRIGGERS + META_SCHEMA
+
+# version 2 indexes counted only terms with a wam, so their overall wams didn't match
+# Student.process_wams for students with a term with nothing graded
+UPGRADE_2 = """
+DROP TRIGGER terms_insert;
+DROP TRIGGER terms_update;
+ALTER TABLE students RENAME COLUMN wam_count TO term_count;
+UPDATE students SET term_count = (SELECT COUNT(*) FROM terms t WHERE t.zid = students.zid);
+""" + TRIGGERS
+
+# a student's previous term with a wam, for rows of terms h
+PREVIOUS = """
+    SELECT q.term FROM terms q WHERE q.zid = h.zid AND q.wam IS NOT NULL AND (q.term_key, q.term) < (h.term_key, h.term)
+    ORDER BY q.term_key DESC, q.term DESC LIMIT 1"""
+
+# chronological order of a term name as one integer, year * 10 + term number (0 for summer)
+# terms of the same year and number (e.g. T1 and S1) are ordered by name, as term_sort_key does
+def term_key(term):
+    t = Term.get(term)
+    return 0 if t is None else t.key[0] * 10 + t.key[1]
+
+# tenths of a mark to a wam, and back
+def to_wam(tenths):
+    return None if tenths is None else tenths / 10
+
+def to_tenths(wam):
+    return None if wam is None else round(wam * 10)
+
+class HistoryIndex(SQLiteStore):
+    VERSION = HISTORY_VERSION
+    SCHEMA = SCHEMA
+    # version 1 indexes only need the meta table added
+    UPGRADES = {1: META_SCHEMA, 2: UPGRADE_2}
+    KIND = "history"
+
+    def __init__(self, path=HISTORY_DB):
+        super().__init__(path)
+
+    # add the term wams of every student in college_data (ALL is skipped), a zid in more than
+    # one college is taken from the last, as on the ALL sheet. Students should have their wams
+    # processed first. fingerprint: data_cache.data_fingerprint of the data, see fingerprint
+    # returns the number of (zid, term) rows added or changed
+    def update(self, college_data, fingerprint=None):
+        students = MergedView(students for (college, students) in college_data.items() if college != "ALL")
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.executemany("""
+                INSERT INTO students (zid, first_names, last_name, college) VALUES (?, ?, ?, ?)
+                ON CONFLICT (zid) DO UPDATE SET first_names = excluded.first_names, last_name = excluded.last_name, college = excluded.college
+                WHERE first_names IS NOT excluded.first_names OR last_name IS NOT excluded.last_name OR college IS NOT excluded.college""",
+                ((s.zid, s.first_names, s.last_name, s.college) for s in students.values()))
+            cur.executemany("""
+                INSERT INTO terms (zid, term, term_key, college, wam) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (zid, term) DO UPDATE SET college = excluded.college, wam = excluded.wam
+                WHERE wam IS NOT excluded.wam OR college IS NOT excluded.college""",
+                ((s.zid, term, term_key(term), s.college, to_tenths(s.wams.get(term))) for s in students.values() for term in s.terms))
+            # rows the upsert wrote, not counting the triggers' updates of students
+            count = cur.rowcount
+            self.set_fingerprint(fingerprint)
+        return count
+
+    # number of zids in the index
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    # term names in the index, in chronological order
+    def terms(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT term, term_key FROM terms ORDER BY term_key, term")]
+
+    # overall wam of a zid from the running sums, as Student.process_wams, None if unknown or no terms
+    def overall_wam(self, zid):
+        row = self.conn.execute("SELECT wam_total, term_count FROM students WHERE zid = ?", (zid,)).fetchone()
+        if row is None or not row[1]:
+            return None
+        return round(row[0] / row[1] / 10, 1)
+
+    # a zid's terms in order as (term, college, wam, change since their previous wam)
+    # wam is None for a term with nothing graded, change is None without a wam either side
+    def trend(self, zid):
+        rows = []
+        last = None
+        for (term, college, wam) in self.conn.execute("SELECT term, college, wam FROM terms WHERE zid = ? ORDER BY term_key, term", (zid,)):
+            change = None if wam is None or last is None else to_wam(wam - last)
+            rows.append((term, college, to_wam(wam), change))
+            if wam is not None:
+                last = wam
+        return rows
+
+    # (zid, college, previous term, previous wam, wam) of every student with a wam in term and an
+    # earlier one, where = extra SQL conditions on the term row h and the previous row p
+    def _with_previous(self, term, college=None, where="", params=()):
+        query = f"""
+            SELECT h.zid, h.college, p.term, p.wam, h.wam FROM terms h
+            JOIN terms p ON p.zid = h.zid AND p.term = ({PREVIOUS})
+            WHERE h.term = ? AND h.wam IS NOT NULL"""
+        args = [term]
+        if college is not None:
+            query += " AND h.college = ?"
+            args.append(college)
+        return self.conn.execute(query + where, args + list(params)).fetchall()
+
+    # the k biggest wam drops as (zid, college, from term, to term, from wam, to wam, drop),
+    # with anyone tied with the k-th, or every drop if k is None.
+    # With term: drops from each student's previous term into term. Without: each student's
+    # biggest drop between any two of their terms in a row (the latest, if tied)
+    def drops(self, term=None, college=None, k=10):
+        if term is not None:
+            rows = [(zid, c, prev_term, term, prev, wam) for (zid, c, prev_term, prev, wam) in self._with_previous(term, college, " AND p.wam > h.wam")]
+        else:
+            query = """
+                SELECT zid, college, prev_term, term, prev, wam FROM (
+                    SELECT zid, college, term, term_key, wam, lag(term) OVER w AS prev_term, lag(wam) OVER w AS prev FROM terms
+                    WHERE wam IS NOT NULL WINDOW w AS (PARTITION BY zid ORDER BY term_key, term))
+                WHERE prev > wam"""
+            args = []
+            if college is not None:
+                query += " AND college = ?"
+                args.append(college)
+            best = {}
+            for row in self.conn.execute(query + " ORDER BY zid, term_key, term", args):
+                if row[0] not in best or row[4] - row[5] >= best[row[0]][4] - best[row[0]][5]:
+                    best[row[0]] = row
+            rows = list(best.values())
+        rows.sort(key=lambda row: (row[5] - row[4], row[0]))
+        rows = [(zid, c, from_term, to_term, to_wam(prev), to_wam(wam), to_wam(prev - wam)) for (zid, c, from_term, to_term, prev, wam) in rows]
+        return top_k(rows, [-row[6] for row in rows], k)
+
+    # students under below in term who were at or above it in their previous term, as
+    # (zid, college, previous term, previous wam, wam), lowest wam first
+    # first term students have no previous term, so aren't counted as newly under
+    def newly_under(self, term, college=None, below=60):
+        limit = to_tenths(below)
+        rows = self._with_previous(term, college, " AND h.wam < ? AND p.wam >= ?", (limit, limit))
+        return [(zid, c, prev_term, to_wam(prev), to_wam(wam)) for (zid, c, prev_term, prev, wam) in sorted(rows, key=lambda row: (row[4], row[0]))]
+
+########
+# MAIN #
+########
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query the student history index kept by college_academics.py --history.")
+    parser.add_argument("--db", default=HISTORY_DB, help=f"history index file (default: {HISTORY_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trend = commands.add_parser("trend", help="a student's wam in each term and their overall wam")
+    trend.add_argument("zid")
+    drops = commands.add_parser("drops", help="biggest wam drops between terms in a row")
+    drops.add_argument("-t", "--term", help="only drops into this term, e.g. 23T1 (default: any terms)")
+    drops.add_argument("-c", "--college")
+    drops.add_argument("-k", type=int, default=10, help="number of students, plus any tied (default: 10)")
+    under = commands.add_parser("under", help="students newly under a wam in a term")
+    under.add_argument("-t", "--term", help="term code, e.g. 23T1 (default: the latest term)")
+    under.add_argument("-c", "--college")
+    under.add_argument("--below", type=float, default=60, help="wam (default: 60)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isfile(args.db):
+        print(f"Could not find {args.db}. Please run college_academics.py with --history first.")
+        sys.exit(1)
+
+    term = None
+    if getattr(args, 'term', None):
+        term = convert_term_name(args.term)
+        if term is None:
+            print(f"Invalid term '{args.term}'")
+            sys.exit(1)
+    college = getattr(args, 'college', None)
+
+    with HistoryIndex(args.db) as index:
+        if args.command == "trend":
+            rows = index.trend(args.zid)
+            if not rows:
+                print(f"No history for {args.zid}")
+                sys.exit(1)
+            for (term, c, wam, change) in rows:
+                print(f"{convert_term_name(term) or term:<6}{c:<6}{'-' if wam is None else wam:>6}{'' if change is None else f'{change:+.1f}':>7}")
+            print(f"Overall WAM: {index.overall_wam(args.zid)}")
+        elif args.command == "drops":
+            for (zid, c, from_term, to_term, prev, wam, drop) in index.drops(term, college, args.k):
+                print(f"{zid:<10}{c:<6}{convert_term_name(from_term) or from_term} {prev:>5} -> {convert_term_name(to_term) or to_term} {wam:>5}  -{drop:.1f}")
+        else:
+            if term is None:
+                terms = index.terms()
+                if not terms:
+                    sys.exit(0)
+                term = terms[-1]
+            print(f"Newly under {args.below:g} in {convert_term_name(term) or term}:")
+            for (zid, c, prev_term, prev, wam) in index.newly_under(term, college, args.below):
+                print(f"{zid:<10}{c:<6}{wam:>5}  (was {prev} in {convert_term_name(prev_term) or prev_term})")
+
+if __name__ == "__main__":
+    main()
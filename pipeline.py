@@ -0,0 +1,245 @@
+# Asyncio pipeline for college_academics.py --pipeline, where the stages of a run overlap
+# instead of running one after the other. Each pdf is converted by pdftotext subprocesses as
+# soon as a slot is free and its text goes on a queue to the parse workers, a college goes on
+# to its wams as soon as all of its files are parsed, and its sheets are written into every
+# term's workbook as soon as its wams are done, while later colleges are still being parsed.
+# Queues between the stages are bounded (pipeline_queue_size), so a stage that gets ahead
+# waits for the next one instead of holding everything in memory.
+# The workbooks and cache are the same as a run without --pipeline, except that the terms have
+# to be given up front (-t), as the pipeline starts exporting before every file is parsed, and
+# a term with no results is only reported once the others have been exported
+
+import os
+import asyncio
+from config import *
+from data_cache import *
+from extract import BACKENDS, extract_pdfs, page_ranges
+
+# candidate terms of a -t spec before any file is parsed, for select_terms' rules once it is:
+# a single code must have results, a range is every term between its ends that has results.
+# returns (term names in export order, set of the term names given as single codes)
+# raises ValueError for invalid terms
+def spec_terms(spec):
+    terms = []
+    single = set()
+    for part in spec.split(','):
+        ends = [convert_term_name(code) for code in part.split('..')]
+        if None in ends or len(ends) > 2:
+            raise ValueError(f"Invalid term or term range '{part.strip()}'")
+        if len(ends) == 1:
+            selected = ends
+            single.add(ends[0])
+        else:
+            start, end = Term.get(ends[0]).key, Term.get(ends[1]).key
+            codes = [f"{year:02d}{letter}{number}" for year in range(start[0], end[0] + 1)
+                     for letter in TERM_KINDS for number in TERM_NUMBERS]
+            selected = sorted((convert_term_name(code) for code in codes if start <= Term.get(code).key <= end), key=term_sort_key)
+        terms += [t for t in selected if t not in terms]
+    return terms, single
+
+# run a command, returns (stdout bytes, None) or (None, error message)
+async def run_command(args):
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    except OSError as e:
+        return None, str(e)
+    out, err = await proc.communicate()
+    if proc.returncode:
+        return None, err.decode(errors='replace').strip() or f"exit status {proc.returncode}"
+    return out, None
+
+class Pipeline:
+
+    # app: the college_academics module whose parsing, wam and export steps are run, passed in
+    # rather than imported so a run of college_academics.py doesn't load it again by name
+    # entries: cached entries as loaded, terms: -t spec, colleges: list of colleges to export
+    # or None for all, export: write the xlsx workbooks (otherwise only the data is made ready)
+    def __init__(self, app, directory, entries, terms, colleges=None, backend=pdf_backend,
+                 output_dir='.', write_only=False, export=True):
+        self.app = app
+        self.entries, self.stale, self.dirty = check_sources(directory, entries)
+        self.terms, self.single_terms = spec_terms(terms)
+        self.backend = backend
+        self.output_dir = output_dir
+        self.write_only = write_only
+        self.export = export
+
+        # source paths of each college in merge order, so a college's students are merged
+        # the same way merge_entries does once all of them are parsed
+        self.files = {}
+        self.college_of = {}
+        for path in sorted(list(self.entries) + [path for (path, *_) in self.stale], key=txt_path):
+            college = self.entries[path].college if path in self.entries else app.parse_college_name(os.path.basename(path).split()[0])
+            self.files.setdefault(college, []).append(path)
+            self.college_of[path] = college
+        self.pending = {college: len(paths) for (college, paths) in self.files.items()}
+
+        if colleges is not None:
+            missing = [c for c in colleges if c not in self.files]
+            if missing:
+                raise ValueError(f"No results for college(s): {', '.join(missing)}")
+        self.colleges = colleges
+
+        self.parsed = {}    # path: FileEntry of stale files parsed this run
+        self.failed = []    # stale pdf paths that failed to convert, left out of the cache
+        self.ready = {}     # college: students dict with wams done, in the order they were ready
+        self.engines = {}
+        self.workbooks = {} # term: (WorkbookExport, queue of colleges to add, task adding them)
+
+    def exported(self, college):
+        return self.colleges is None or college in self.colleges
+
+    # returns (entries, whether any files were parsed, whether the cache changed,
+    # college_data, all_terms, engines, terms exported), as update_entries, merge_entries,
+    # calculate_wams and select_terms would, and sets missing
+    def run(self):
+        return asyncio.run(self.main())
+
+    async def main(self):
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+        loop = asyncio.get_running_loop()
+        self.parse_queue = asyncio.Queue(pipeline_queue_size)
+        self.wam_queue = asyncio.Queue(pipeline_queue_size)
+        self.pdf_slots = asyncio.Semaphore(max(1, pdf_workers))
+
+        workers = max(1, min(parse_workers, len(self.stale)))
+        # worker processes are only started once a file is sent to them
+        with ThreadPoolExecutor() as threads, ProcessPoolExecutor(max_workers=workers) as processes:
+            self.threads = threads
+            self.parsers = processes if workers > 1 else threads
+
+            parse_tasks = [asyncio.create_task(self.parse_worker()) for _ in range(workers)]
+            wam_task = asyncio.create_task(self.wam_worker())
+            extract_tasks = [asyncio.create_task(self.extract(file)) for file in self.stale]
+
+            # cached files are ready straight away
+            for path in list(self.entries):
+                await self.file_done(path)
+
+            await asyncio.gather(*extract_tasks)
+            for _ in parse_tasks:
+                await self.parse_queue.put(None)
+            await asyncio.gather(*parse_tasks)
+
+            # every file is parsed, so the cache can be saved while the last colleges are exported
+            for (path, *_) in self.stale:
+                if path in self.parsed:
+                    self.entries[path] = self.parsed[path]
+            changed = bool(self.stale) or self.dirty
+            save = loop.run_in_executor(threads, save_file_cache, self.entries) if changed else None
+
+            await self.wam_queue.put(None)
+            await wam_task
+            for (_, queue, task) in self.workbooks.values():
+                await queue.put(None)
+                await task
+
+            college_data, all_terms = merge_entries(self.entries)
+            export_data = college_data if self.colleges is None else {c: college_data[c] for c in college_data if c in self.colleges}
+            terms = [term for term in self.terms if term in all_terms]
+            await asyncio.gather(*(loop.run_in_executor(threads, workbook.finish, export_data) for (workbook, *_) in self.workbooks.values()))
+            if save is not None:
+                await save
+
+        # codes of single terms that turned out to have no results
+        self.missing = [convert_term_name(term) for term in self.terms if term in self.single_terms and term not in all_terms]
+        return self.entries, bool(self.stale), changed, college_data, all_terms, self.engines, terms
+
+    # a file is parsed, cached or failed, the college goes on to its wams after its last file
+    async def file_done(self, path):
+        college = self.college_of[path]
+        self.pending[college] -= 1
+        if not self.pending[college] and any(p in self.entries or p in self.parsed for p in self.files[college]):
+            await self.wam_queue.put(college)
+
+    # text of a stale file for the parse queue, None to parse its txt file
+    async def extract(self, file):
+        path = file[0]
+        college = self.college_of[path]
+        text, error = None, None
+        if path.endswith(".pdf"):
+            if self.backend == 'file':
+                if not self.app.txt_is_current(path):
+                    async with self.pdf_slots:
+                        _, error = await run_command(["pdftotext", "-layout", path])
+                    print(f"Failed to convert {path}: {error}" if error else f"Converted {path}")
+            elif self.backend == 'pdftotext' or not BACKENDS[self.backend].available():
+                text, error = await self.pdftotext(path)
+                print(f"Failed to extract {path}: {error}" if error else f"Extracted {path} (pdftotext)")
+            else:
+                # pypdf runs in its own pool of processes, see extract.extract_pdfs
+                text, info = (await asyncio.get_running_loop().run_in_executor(self.threads, extract_pdfs, [path], self.backend))[path]
+                if text is None:
+                    error = info
+                print(f"Failed to extract {path}: {error}" if error else f"Extracted {path} ({info})")
+
+        if error:
+            self.failed.append(path)
+            await self.file_done(path)
+        else:
+            await self.parse_queue.put((file, college, text))
+
+    # pdftotext -layout text of a pdf, a process per page range as in extract.py, returns (text, error)
+    async def pdftotext(self, path):
+        n = await asyncio.get_running_loop().run_in_executor(self.threads, BACKENDS['pdftotext'].page_count, path)
+
+        async def chunk(first, last):
+            args = ["pdftotext", "-layout", "-enc", "UTF-8"]
+            if first is not None:
+                args += ["-f", str(first), "-l", str(last)]
+            async with self.pdf_slots:
+                return await run_command(args + [path, "-"])
+
+        chunks = await asyncio.gather(*(chunk(first, last) for (first, last) in (page_ranges(n, pdf_chunk_pages) if n else [(None, None)])))
+        errors = [error for (_, error) in chunks if error]
+        if errors:
+            return None, errors[0]
+        return ''.join(out.decode('utf-8', errors='replace') for (out, _) in chunks), None
+
+    async def parse_worker(self):
+        loop = asyncio.get_running_loop()
+        while (job := await self.parse_queue.get()) is not None:
+            ((path, size, mtime, digest), college, text) = job
+            print(f"Processing {college}...")
+            students, terms = await loop.run_in_executor(self.parsers, self.app.parse_file, txt_path(path), college, text)
+            self.parsed[path] = FileEntry(path, size, mtime, digest, college, students, terms)
+            await self.file_done(path)
+
+    # wams of each college as it is ready, then its sheets go to the term workbooks
+    async def wam_worker(self):
+        loop = asyncio.get_running_loop()
+        while (college := await self.wam_queue.get()) is not None:
+            entries = [self.entries.get(path) or self.parsed.get(path) for path in self.files[college]]
+            entries = [entry for entry in entries if entry is not None]
+            students = {}
+            for entry in entries:
+                students.update(entry.students)
+            await loop.run_in_executor(self.threads, self.app.calculate_wams, {college: students})
+            self.engines.update(await loop.run_in_executor(self.threads, self.app.statistics_engines, {college: students}, len(self.terms)))
+            self.ready[college] = students
+
+            if not self.export:
+                continue
+            college_terms = set().union(*(entry.terms for entry in entries))
+            for term in self.terms:
+                if term not in self.workbooks:
+                    if term not in college_terms:
+                        continue
+                    await self.start_workbook(term)
+                elif self.exported(college):
+                    await self.workbooks[term][1].put(college)
+
+    # a term's workbook once a college has results for it, the colleges ready before it are added first
+    async def start_workbook(self, term):
+        os.makedirs(self.output_dir, exist_ok=True)
+        workbook = self.app.WorkbookExport(os.path.join(self.output_dir, self.app.export_name(term, self.colleges) + ".xlsx"), term, self.write_only)
+        queue = asyncio.Queue(pipeline_queue_size)
+        self.workbooks[term] = (workbook, queue, asyncio.create_task(self.workbook_worker(workbook, queue)))
+        for college in self.ready:
+            if self.exported(college):
+                await queue.put(college)
+
+    async def workbook_worker(self, workbook, queue):
+        loop = asyncio.get_running_loop()
+        while (college := await queue.get()) is not None:
+            await loop.run_in_executor(self.threads, workbook.add_college, college, self.ready[college], self.engines.get(college))
@@ -0,0 +1,112 @@
+# Opt-in run profiling for college_academics.py
+# Code is timed in stages with `with profiler.stage(name, college, term) as counts:`, where
+# counts is a dict of counters for the stage (lines, students, courses, ...). With memory
+# tracing on, each stage also records its peak Python memory from tracemalloc.
+# The profiler is off unless enable() is called, and stage() then does next to nothing,
+# so the calls stay in place. report() gives a JSON ready dict, write() saves it
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.stages = []    # finished stage records, in the order they finished
+        self.stack = []     # stages in progress
+        self.peak = 0
+        self.started = None
+
+    def enable(self, trace_memory=True):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.started = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # time the body of a with block, yields the stage's counts dict
+    # stages can be nested, a stage's peak memory includes its nested stages
+    @contextmanager
+    def stage(self, name, college=None, term=None, **counts):
+        if not self.enabled:
+            yield counts
+            return
+        record = {'stage': name, 'college': college, 'term': term, 'seconds': 0.0, 'counts': counts}
+        if self.trace_memory:
+            self._reset_peak()
+            record['peak_memory'] = tracemalloc.get_traced_memory()[0]
+        self.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self.stack.pop()
+            if self.trace_memory:
+                record['peak_memory'] = max(record['peak_memory'], tracemalloc.get_traced_memory()[1])
+                self._carry_peak(record['peak_memory'])
+            self.stages.append(record)
+
+    # tracemalloc only keeps one peak, so before resetting it for a new stage the
+    # peak so far is passed on to the stages in progress
+    def _reset_peak(self):
+        self._carry_peak(tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def _carry_peak(self, peak):
+        self.peak = max(self.peak, peak)
+        for record in self.stack:
+            record['peak_memory'] = max(record['peak_memory'], peak)
+
+    # add stage records made elsewhere, e.g. returned by take() in a worker process
+    def add(self, records):
+        if self.enabled:
+            self.stages.extend(records)
+            for record in records:
+                self.peak = max(self.peak, record.get('peak_memory', 0))
+
+    # remove and return the finished stage records
+    def take(self):
+        records, self.stages = self.stages, []
+        return records
+
+    def report(self):
+        if self.trace_memory:
+            self._carry_peak(tracemalloc.get_traced_memory()[1])
+        stages = []
+        summary = {}
+        for record in self.stages:
+            record = dict(record)
+            secs = record['seconds']
+            record['rates'] = {f'{name}_per_second': (n / secs if secs else None) for (name, n) in record['counts'].items()}
+            stages.append(record)
+            # totals of each stage over all colleges and terms
+            total = summary.setdefault(record['stage'], {'seconds': 0.0, 'calls': 0, 'counts': {}})
+            total['seconds'] += secs
+            total['calls'] += 1
+            for (name, n) in record['counts'].items():
+                total['counts'][name] = total['counts'].get(name, 0) + n
+        return {
+            'total_seconds': time.perf_counter() - self.started if self.started is not None else None,
+            'peak_memory': self.peak if self.trace_memory else None,
+            'summary': summary,
+            'stages': stages,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+# profiler for the run, enabled by college_academics.py --profile
+profiler = Profiler()
+
+# worker process initializer, so stages in workers are recorded the same way as the parent
+# stage records copied from the parent by fork are dropped, the parent already has them
+def init_worker(enabled, trace_memory):
+    profiler.stages = []
+    profiler.stack = []
+    if enabled and not profiler.enabled:
+        profiler.enable(trace_memory)
@@ -0,0 +1,206 @@
+# Rankings of a college's students in one term, for high performer statistics and queries
+# like top 10 wams, best marks in a course and a student's rank or percentile.
+# TermRanking makes one pass over the students in order, as get_statistics always has, which
+# gives the same results with the same tie rules. The sorted orders used for queries are
+# only built on the first query, then top-k is a slice and rank/percentile are bisections.
+# Ties: top_wam and top_course include everyone tied with the k-th place, and tied students
+# share a rank, the number of students ahead of them plus one
+
+import heapq
+from bisect import bisect_left, bisect_right
+from functools import cached_property
+from config import HD_GRADE, FAIL_GRADES
+
+class TermRanking:
+
+    # students: dict of zid:Student with wams processed
+    def __init__(self, students, term):
+        self.students = students
+        self.term = term
+        self.enrolled = []    # (zid, courses) of every student in the term, in student order
+        self.wams = []        # (wam, zid) of students with a wam, in student order
+        self.hds = []         # (zid, hd count, course count) of every student in the term
+        self.course_orders = {}   # course code: sorted order, see course_order
+
+        total_wam = 0
+        wam_count = 0
+        # lists of tuples for highest (zid, wam), (zid, code+subject, mark)
+        top_wam = [('<None>', 0)]
+        top_zids = set()
+        top_sub = [('<None>', '<None>', 0)]
+        # fulfilling 2/2 or 3/3 HDs
+        full_hd = []
+        also_wam = None #get 2nd best subjects prizes if zid is also highest wam
+        under_perf = {}
+
+        for zid in students:
+            courses = students[zid].terms.get(term)
+            if courses is None:
+                continue
+            self.enrolled.append((zid, courses))
+            t_wam = top_wam[0][1]
+            wam = students[zid].wams[term]
+            if wam is not None:
+                #check is wam higher, and add to top_wam if so
+                if wam > t_wam:
+                    top_wam.clear()
+                    top_zids.clear()
+                if wam >= t_wam:
+                    top_wam.append((zid, wam))
+                    top_zids.add(zid)
+
+                # for average college wam
+                wam_count += 1
+                total_wam += wam
+                self.wams.append((wam, zid))
+
+            #keep track of number of HDs or fails
+            hd_count = 0
+            fail_count = 0
+            for sub in courses:
+                t_sub = top_sub[0][2]
+
+                if sub.hasGrade():
+                    grade = sub.mark
+                    if grade >= t_sub:
+                        if zid in top_zids: #if zid also highest wam
+                            if not also_wam or grade > also_wam[2]:
+                                also_wam = (zid, sub.code + ' ' + sub.name, grade)
+                        else:
+                            if grade > t_sub:
+                                top_sub.clear()
+                            top_sub.append((zid, sub.code + ' ' + sub.name, grade))
+
+                grade_name = sub.grade_name.upper()
+                if grade_name == HD_GRADE:
+                    hd_count += 1
+                elif grade_name in FAIL_GRADES:
+                    fail_count += 1
+
+            sub_count = len(courses) #total subjects taken
+            self.hds.append((zid, hd_count, sub_count))
+
+            #add to full_hd if 2 or more HDs
+            if hd_count >= 2:
+                full_hd.append((zid, hd_count, sub_count))
+
+            #flag if they have failed or is sitting on a Pass
+            if fail_count or (wam is not None and wam < 60):
+                under_perf[zid] = courses
+
+        # a top wam of 0.0 is a wam too, so the placeholder goes once anyone has one
+        if len(top_wam) > 1 and top_wam[0][0] == '<None>':
+            del top_wam[0]
+        if top_sub[0][0] == '<None>':
+            top_sub.clear()
+        if also_wam and also_wam[0] in top_zids: #if also_wam person is in top_wam
+            top_sub.insert(0, also_wam)
+
+        self.college_stats = {'avg_wam': total_wam/wam_count} if wam_count > 0 else {'avg_wam': None}
+        self.high_perf = {'top_wam': top_wam, 'top_sub': top_sub, 'full_hd': full_hd}
+        self.under_perf = under_perf
+
+    # (college_stats, high_perf, under_perf), as get_statistics returns
+    def statistics(self):
+        return self.college_stats, self.high_perf, self.under_perf
+
+    # students with a wam, best first, students with equal wams in student order
+    @cached_property
+    def wam_order(self):
+        return [(zid, -key) for (key, _, zid) in sorted((-wam, i, zid) for (i, (wam, zid)) in enumerate(self.wams))]
+
+    # negated wams of wam_order, ascending, for bisect
+    @cached_property
+    def wam_keys(self):
+        return [-wam for (_, wam) in self.wam_order]
+
+    @cached_property
+    def wam_of(self):
+        return {zid: wam for (wam, zid) in self.wams}
+
+    # the k best wams as (zid, wam), with anyone tied with the k-th, or all of them if k is None
+    def top_wam(self, k=None):
+        return top_k(self.wam_order, self.wam_keys, k)
+
+    # rank of a student's wam, 1 for the best, None if they have no wam this term
+    def rank(self, zid):
+        wam = self.wam_of.get(zid)
+        if wam is None:
+            return None
+        return bisect_left(self.wam_keys, -wam) + 1
+
+    # percentage of students with a wam lower than the student's, None if they have no wam
+    def percentile(self, zid):
+        wam = self.wam_of.get(zid)
+        if wam is None:
+            return None
+        keys = self.wam_keys
+        return 100 * (len(keys) - bisect_right(keys, -wam)) / len(keys)
+
+    # course code: [(mark, zid, Course)] of graded courses, in student order
+    @cached_property
+    def marks(self):
+        marks = {}
+        for (zid, courses) in self.enrolled:
+            for course in courses:
+                if course.hasGrade():
+                    marks.setdefault(course.code, []).append((course.mark, zid, course))
+        return marks
+
+    # (course code, zid): the student's best mark in the course
+    @cached_property
+    def best_marks(self):
+        best = {}
+        for (code, rows) in self.marks.items():
+            for (mark, zid, _) in rows:
+                if mark > best.get((code, zid), -1):
+                    best[code, zid] = mark
+        return best
+
+    # ([(zid, subject, mark)] best first, their negated marks for bisect) of a course,
+    # built when the course is first asked for
+    def course_order(self, code):
+        order = self.course_orders.get(code)
+        if order is None:
+            rows = sorted((-mark, i, zid, course) for (i, (mark, zid, course)) in enumerate(self.marks.get(code, ())))
+            order = self.course_orders[code] = ([(zid, course.code + ' ' + course.name, -key) for (key, _, zid, course) in rows],
+                                                [key for (key, *_) in rows])
+        return order
+
+    # the k best marks in a course as (zid, subject, mark), with anyone tied with the k-th
+    def top_course(self, code, k=None):
+        return top_k(*self.course_order(code), k)
+
+    # rank of a student's best mark in a course, None if they have no mark for it
+    def course_rank(self, zid, code):
+        mark = self.best_marks.get((code, zid))
+        if mark is None:
+            return None
+        return bisect_left(self.course_order(code)[1], -mark) + 1
+
+    # the k best marks over every course as (zid, subject, mark), merged from the per course orders
+    def top_subjects(self, k=10):
+        merged = heapq.merge(*(self.course_order(code)[0] for code in self.marks), key=lambda row: -row[2])
+        rows = []
+        for row in merged:
+            if len(rows) >= k and row[2] != rows[-1][2]:
+                break
+            rows.append(row)
+        return rows
+
+    # students with at least one HD, most first, as (zid, hd count, course count)
+    @cached_property
+    def hd_order(self):
+        return sorted((row for row in self.hds if row[1]), key=lambda row: -row[1])
+
+    # the k students with the most HDs, with anyone tied with the k-th
+    def most_hds(self, k=10):
+        return top_k(self.hd_order, [-row[1] for row in self.hd_order], k)
+
+# first k of rows plus any tied with the k-th, keys: sort keys of rows, ascending
+def top_k(rows, keys, k):
+    if k is None or k >= len(rows):
+        return list(rows)
+    if k <= 0:
+        return []
+    return rows[:bisect_right(keys, keys[k - 1])]
@@ -0,0 +1,179 @@
+# Optional SQLite results store for college_academics.py
+# Keeps students, their term enrolments and courses in indexed tables, so questions like
+# "every term for a zid" or "all fails in COMP courses in a term" are index lookups instead
+# of walks over college_data, and years of history can be kept on disk.
+# Terms are stored by name, as in Student.terms (e.g. "2022 Term 3")
+
+from config import *
+from sqlite_store import SQLiteStore, META_SCHEMA
+
+# bump when the tables change, stored as the database's user_version
+DB_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE students (
+    id INTEGER PRIMARY KEY,
+    zid TEXT NOT NULL,
+    first_names TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    college TEXT NOT NULL,
+    enrol_type TEXT NOT NULL,
+    program TEXT NOT NULL,
+    overall_wam REAL
+);
+CREATE TABLE enrolments (
+    id INTEGER PRIMARY KEY,
+    student INTEGER NOT NULL REFERENCES students(id),
+    term TEXT NOT NULL,
+    wam REAL
+);
+CREATE TABLE courses (
+    id INTEGER PRIMARY KEY,
+    enrolment INTEGER NOT NULL REFERENCES enrolments(id),
+    code TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mark INTEGER,
+    grade_name TEXT NOT NULL
+);
+CREATE INDEX students_zid ON students(zid);
+CREATE INDEX students_college ON students(college);
+CREATE INDEX enrolments_student ON enrolments(student);
+CREATE INDEX enrolments_term ON enrolments(term);
+CREATE INDEX courses_enrolment ON courses(enrolment);
+CREATE INDEX courses_code ON courses(code);
+""" + META_SCHEMA
+
+class ResultsDB(SQLiteStore):
+    VERSION = DB_VERSION
+    SCHEMA = SCHEMA
+    # version 1 databases only need the meta table added
+    UPGRADES = {1: META_SCHEMA}
+
+    # replace the stored results with those of college_data (ALL is skipped), colleges no
+    # longer in it are deleted. fingerprint: data_cache.data_fingerprint of the data, kept
+    # to tell whether a later run's data is the same. students should have their wams processed first
+    def save(self, college_data, fingerprint=None):
+        with self.conn:
+            for college in self.colleges():
+                if college not in college_data:
+                    self._delete_college(college)
+            for college, students in college_data.items():
+                if college != "ALL":
+                    self._save_college(college, students)
+            self.set_fingerprint(fingerprint)
+
+    def _delete_college(self, college):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM courses WHERE enrolment IN (SELECT e.id FROM enrolments e JOIN students s ON e.student = s.id WHERE s.college = ?)", (college,))
+        cur.execute("DELETE FROM enrolments WHERE student IN (SELECT id FROM students WHERE college = ?)", (college,))
+        cur.execute("DELETE FROM students WHERE college = ?", (college,))
+
+    def _save_college(self, college, students):
+        self._delete_college(college)
+        cur = self.conn.cursor()
+        for student in students.values():
+            cur.execute("INSERT INTO students (zid, first_names, last_name, college, enrol_type, program, overall_wam) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (student.zid, student.first_names, student.last_name, college, student.enrol_type, student.program, student.overall_wam))
+            student_id = cur.lastrowid
+            for term, courses in student.terms.items():
+                cur.execute("INSERT INTO enrolments (student, term, wam) VALUES (?, ?, ?)", (student_id, term, student.wams.get(term)))
+                enrolment = cur.lastrowid
+                cur.executemany("INSERT INTO courses (enrolment, code, name, mark, grade_name) VALUES (?, ?, ?, ?, ?)",
+                                [(enrolment, c.code, c.name, c.mark, c.grade_name) for c in courses])
+
+    # colleges with stored results
+    def colleges(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT college FROM students ORDER BY college")]
+
+    # set of stored term names
+    def terms(self):
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT term FROM enrolments")}
+
+    # every term for a zid across colleges, as (college, term, wam) in the order they were saved
+    def student_history(self, zid):
+        return self.conn.execute("""
+            SELECT s.college, e.term, e.wam FROM students s JOIN enrolments e ON e.student = s.id
+            WHERE s.zid = ? ORDER BY e.id""", (zid,)).fetchall()
+
+    # courses matching all the given filters, as (zid, college, term, Course)
+    # subject: course code prefix, e.g. "COMP". fails: only failed courses
+    def find_courses(self, term=None, subject=None, college=None, fails=False):
+        where = []
+        params = []
+        if term is not None:
+            where.append("e.term = ?")
+            params.append(term)
+        if subject is not None:
+            # a range on code rather than LIKE, so the code index is used
+            where.append("c.code >= ? AND c.code < ?")
+            params += [subject, subject + "\uffff"]
+        if college is not None:
+            where.append("s.college = ?")
+            params.append(college)
+        if fails:
+            where.append(f"upper(c.grade_name) IN ({', '.join('?' * len(FAIL_GRADES))})")
+            params += FAIL_GRADES
+        rows = self.conn.execute(f"""
+            SELECT s.zid, s.college, e.term, c.code, c.name, c.mark, c.grade_name
+            FROM courses c JOIN enrolments e ON c.enrolment = e.id JOIN students s ON e.student = s.id
+            {"WHERE " + " AND ".join(where) if where else ""} ORDER BY c.id""", params)
+        for (zid, college, term, *values) in rows:
+            yield zid, college, term, make_course(values)
+
+    # dict of zid:Student for a college in saved order, with wams set, the same shape as
+    # college_data[college]. If term is given only students enrolled in it are loaded, with
+    # just that term, which is all get_statistics and the exporters need for one term
+    def students(self, college, term=None):
+        if term is None:
+            rows = self.conn.execute("""
+                SELECT s.id, s.first_names, s.last_name, s.zid, s.college, s.enrol_type, s.program, s.overall_wam, e.id, e.term, e.wam
+                FROM students s LEFT JOIN enrolments e ON e.student = s.id
+                WHERE s.college = ? ORDER BY s.id, e.id""", (college,))
+        else:
+            rows = self.conn.execute("""
+                SELECT s.id, s.first_names, s.last_name, s.zid, s.college, s.enrol_type, s.program, s.overall_wam, e.id, e.term, e.wam
+                FROM students s JOIN enrolments e ON e.student = s.id
+                WHERE s.college = ? AND e.term = ? ORDER BY s.id, e.id""", (college, term))
+
+        students = {}
+        by_id = {}
+        enrolments = {}
+        for (student_id, *info, overall_wam, enrolment, enrol_term, wam) in rows:
+            student = by_id.get(student_id)
+            if student is None:
+                student = by_id[student_id] = Student.__new__(Student)
+                student.__setstate__(info + [{}, {}, overall_wam])
+                students[student.zid] = student
+            if enrolment is not None:
+                student.wams[enrol_term] = wam
+                enrolments[enrolment] = student.terms[enrol_term] = []
+
+        if enrolments:
+            query = "SELECT c.enrolment, c.code, c.name, c.mark, c.grade_name FROM courses c JOIN enrolments e ON c.enrolment = e.id JOIN students s ON e.student = s.id WHERE s.college = ?"
+            params = [college]
+            if term is not None:
+                query += " AND e.term = ?"
+                params.append(term)
+            for (enrolment, *values) in self.conn.execute(query + " ORDER BY c.id", params):
+                enrolments[enrolment].append(make_course(values))
+        return students
+
+    # {term: (total, count)} wam sums of a college, or of every zid once (the last saved)
+    # if college is None. Same counting and tenths as data_cache.wam_sums, for statistics.py
+    def wam_sums(self, college=None):
+        if college is None:
+            rows = self.conn.execute("""
+                SELECT e.term, SUM(CASE WHEN e.wam IS NOT NULL THEN CAST(round(e.wam * 10) AS INTEGER) ELSE 0 END), COUNT(e.wam)
+                FROM enrolments e WHERE e.student IN (SELECT max(id) FROM students GROUP BY zid)
+                GROUP BY e.term""")
+        else:
+            rows = self.conn.execute("""
+                SELECT e.term, SUM(CASE WHEN e.wam IS NOT NULL THEN CAST(round(e.wam * 10) AS INTEGER) ELSE 0 END), COUNT(e.wam)
+                FROM enrolments e JOIN students s ON e.student = s.id
+                WHERE s.college = ? GROUP BY e.term""", (college,))
+        return {term: (total, count) for (term, total, count) in rows}
+
+def make_course(values):
+    course = Course.__new__(Course)
+    course.__setstate__(tuple(values))
+    return course
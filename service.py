@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# Long running service for college_academics.py: the transcripts are loaded and their wams
+# worked out once, then kept in memory to answer requests over local HTTP or a Unix socket.
+# A watcher thread checks the data directory every few seconds and re-parses new or changed
+# files in the background (through the same per-file cache as college_academics.py); requests
+# keep using the previous data until the new data is ready, then switch over.
+# usage: service.py [directory] [--host 127.0.0.1] [--port 8080] [--socket PATH] [-o DIR]
+# GET requests, answered with JSON unless noted:
+#   /status                            when the data was loaded, counts, last reload error
+#   /colleges                          colleges with results
+#   /terms                             terms with results, as {"code", "name"}
+#   /stats?term=23T1[&college=IH,FTH]  get_statistics for each college, as exporters.py stats
+#                                      rows. term takes codes and ranges like -t, e.g. 22T1..22T3
+#   /students/<zid>                    a student's results in every college they appear in
+#   /top?term=23T1[&college=IH][&k=10][&course=COMP1511]
+#                                      each college's k best wams, or best marks in a course,
+#                                      with ties included (ranking.TermRanking)
+#   /rank/<zid>?term=23T1              the student's wam rank and percentile in their college
+#   /wams                              wam trend of every college, as exporters.py wams rows
+#   /workbook?term=23T1[&college=IH]   the term's workbook, written to the output directory
+#                                      with export_to_excel and sent as xlsx, a college one goes to
+#                                      its own file (College_Academics_23T1_IH.xlsx)
+# POST /reload checks the data directory straight away
+
+import os, sys
+import json
+import time
+import argparse
+import threading
+import socketserver
+import stat
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import *
+from data_cache import load_file_cache, merge_entries, college_wam_sums
+from exporters import stats_records, wam_records, STATS_COLUMNS, WAM_COLUMNS
+from extract import BACKENDS
+from college_academics import (parse_college_name, select_terms, update_entries, calculate_wams,
+                               statistics_engines, college_statistics, export_to_excel, export_name)
+from ranking import TermRanking
+
+XLSX_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# error answered with an HTTP status
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# one loaded copy of the data, never changed once made so requests can share it
+class Dataset:
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.college_data, self.all_terms = merge_entries(entries)
+        calculate_wams(self.college_data)
+        # requests keep coming for the same data, so the engines always pay for themselves
+        self.engines = statistics_engines(self.college_data)
+        self.loaded = time.time()
+        self._wam_sums = None
+        self._rankings = {}
+
+    # {college: {term: [total, count]}}, worked out on first use
+    def wam_sums(self):
+        if self._wam_sums is None:
+            self._wam_sums = college_wam_sums(self.entries)
+        return self._wam_sums
+
+    # TermRanking of a college in a term, kept for later requests
+    def ranking(self, college, term):
+        ranking = self._rankings.get((college, term))
+        if ranking is None:
+            ranking = self._rankings[college, term] = TermRanking(self.college_data[college], term)
+        return ranking
+
+class Service:
+
+    def __init__(self, directory, backend=pdf_backend, output_dir='.'):
+        self.directory = directory
+        self.backend = backend
+        self.output_dir = output_dir
+        self.reload_lock = threading.Lock()
+        # export_to_excel rewrites a term's workbook in place, one export at a time
+        self.export_lock = threading.Lock()
+        self.last_error = None
+        entries, _, _ = update_entries(directory, load_file_cache(), backend)
+        self.data = Dataset(entries)
+
+    # check the data directory, and load the data again if any files changed
+    # returns whether the data changed
+    def reload(self):
+        with self.reload_lock:
+            entries, _, changed = update_entries(self.directory, dict(self.data.entries), self.backend)
+            if changed:
+                self.data = Dataset(entries)
+                print(f"Reloaded {len(entries)} files")
+            return changed
+
+    # watcher thread: reload every poll seconds until stop is set
+    def watch(self, poll, stop):
+        while not stop.wait(poll):
+            try:
+                self.reload()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Reload failed ({self.last_error})")
+
+    def status(self):
+        data = self.data
+        return {
+            'directory': os.path.abspath(self.directory),
+            'loaded': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(data.loaded)),
+            'files': len(data.entries),
+            'colleges': len(data.college_data),
+            'students': sum(len(students) for students in data.college_data.values()),
+            'terms': len(data.all_terms),
+            'last_error': self.last_error,
+        }
+
+    def colleges(self):
+        return sorted(self.data.college_data)
+
+    def terms(self):
+        return [{'code': convert_term_name(term), 'name': term.title()} for term in sorted(self.data.all_terms, key=term_sort_key)]
+
+    # dict of college:students dict from a comma separated college parameter, or every college
+    def select_colleges(self, data, spec):
+        if not spec:
+            return data.college_data
+        colleges = [parse_college_name(c.strip()) for c in spec.split(',')]
+        missing = [c for c in colleges if c not in data.college_data]
+        if missing:
+            raise RequestError(404, f"No results for college(s): {', '.join(missing)}")
+        return {c: data.college_data[c] for c in data.college_data if c in colleges}
+
+    def select_terms(self, data, spec):
+        if not spec:
+            raise RequestError(400, "No term given")
+        try:
+            return select_terms(spec, data.all_terms)
+        except ValueError as e:
+            raise RequestError(404, str(e))
+
+    # {term name: list of stats rows}
+    def stats(self, term, college=None):
+        data = self.data
+        college_data = self.select_colleges(data, college)
+        result = {}
+        for term in self.select_terms(data, term):
+            rows = result[term.title()] = []
+            for c, students in college_data.items():
+                stats = college_statistics(students, term, data.engines.get(c), c)
+                rows += [dict(zip(STATS_COLUMNS, row)) for row in stats_records(c, students, term, *stats)]
+        return result
+
+    def student(self, zid):
+        found = []
+        for college, students in self.data.college_data.items():
+            student = students.get(zid)
+            if student is None:
+                continue
+            record = dict(zip(Student.info_fields, student.info()))
+            record['overall_wam'] = student.overall_wam
+            record['terms'] = {
+                term.title(): {'wam': student.wams.get(term),
+                               'courses': [dict(zip(('code', 'name', 'mark', 'grade_name'), course.__getstate__())) for course in courses]}
+                for term, courses in sorted(student.terms.items(), key=lambda item: term_sort_key(item[0]))}
+            found.append(record)
+        if not found:
+            raise RequestError(404, f"No results for zid {zid}")
+        return found
+
+    # {term name: {college: [{zid, name, wam}] or, for a course, [{zid, name, subject, mark}]}}
+    def top(self, term, college=None, k=10, course=None):
+        data = self.data
+        college_data = self.select_colleges(data, college)
+        try:
+            k = int(k)
+        except ValueError:
+            raise RequestError(400, f"Invalid k '{k}'")
+        result = {}
+        for term in self.select_terms(data, term):
+            tops = result[term.title()] = {}
+            for c, students in college_data.items():
+                ranking = data.ranking(c, term)
+                if course:
+                    rows = [{'zid': zid, 'name': full_name(students[zid]), 'subject': subject, 'mark': mark}
+                            for (zid, subject, mark) in ranking.top_course(course.upper(), k)]
+                else:
+                    rows = [{'zid': zid, 'name': full_name(students[zid]), 'wam': wam} for (zid, wam) in ranking.top_wam(k)]
+                tops[c] = rows
+        return result
+
+    # [{college, term, wam, rank, percentile, of}] for each college the student is in
+    def rank(self, zid, term):
+        data = self.data
+        result = []
+        for term in self.select_terms(data, term):
+            for c, students in data.college_data.items():
+                if zid not in students:
+                    continue
+                ranking = data.ranking(c, term)
+                result.append({'college': c, 'term': term.title(), 'wam': ranking.wam_of.get(zid), 'rank': ranking.rank(zid),
+                               'percentile': ranking.percentile(zid), 'of': len(ranking.wams)})
+        if not result:
+            raise RequestError(404, f"No results for zid {zid}")
+        return result
+
+    def wams(self):
+        return [dict(zip(WAM_COLUMNS, row)) for row in wam_records(self.data.wam_sums())]
+
+    # path of the term's workbook, exported from the current data. Only some colleges go to
+    # their own workbook, as with -c, so the one of every college is left as it was
+    def workbook(self, term, college=None):
+        data = self.data
+        college_data = self.select_colleges(data, college)
+        terms = self.select_terms(data, term)
+        if len(terms) != 1:
+            raise RequestError(400, "A workbook is for one term")
+        filename = os.path.join(self.output_dir, export_name(terms[0], list(college_data) if college else None) + ".xlsx")
+        with self.export_lock:
+            export_to_excel(filename, college_data, terms[0], data.engines)
+        return filename
+
+def full_name(student):
+    return student.first_names + ' ' + student.last_name
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for (name, values) in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        service = self.server.service
+        try:
+            if parts == ['status']:
+                self.send_json(service.status())
+            elif parts == ['colleges']:
+                self.send_json(service.colleges())
+            elif parts == ['terms']:
+                self.send_json(service.terms())
+            elif parts == ['stats']:
+                self.send_json(service.stats(query.get('term'), query.get('college')))
+            elif len(parts) == 2 and parts[0] == 'students':
+                self.send_json(service.student(parts[1]))
+            elif parts == ['top']:
+                self.send_json(service.top(query.get('term'), query.get('college'), query.get('k', 10), query.get('course')))
+            elif len(parts) == 2 and parts[0] == 'rank':
+                self.send_json(service.rank(parts[1], query.get('term')))
+            elif parts == ['wams']:
+                self.send_json(service.wams())
+            elif parts == ['workbook']:
+                filename = service.workbook(query.get('term'), query.get('college'))
+                with open(filename, 'rb') as f:
+                    self.send_body(f.read(), XLSX_TYPE, {'Content-Disposition': f'attachment; filename="{os.path.basename(filename)}"'})
+            else:
+                raise RequestError(404, f"Unknown path {url.path}")
+        except RequestError as e:
+            self.send_json({'error': str(e)}, e.status)
+
+    def do_POST(self):
+        if urlsplit(self.path).path.strip('/') != 'reload':
+            self.send_json({'error': f"Unknown path {self.path}"}, 404)
+            return
+        self.send_json({'changed': self.server.service.reload()})
+
+    def send_json(self, value, status=200):
+        self.send_body(json.dumps(value, ensure_ascii=False).encode('utf-8'), 'application/json', status=status)
+
+    def send_body(self, body, content_type, headers={}, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Unix socket clients have no address
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+# whether path is a Unix socket, False if there is nothing there
+def is_socket(path):
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # socket file left behind by a service that didn't shut down cleanly, anything else
+        # at the path is left alone and binding fails
+        if is_socket(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve college academic results from memory over HTTP.")
+    parser.add_argument("directory", nargs="?", default="data", help="directory of transcript pdf/txt files (default: data)")
+    parser.add_argument("--host", default=service_host, help=f"address to listen on (default: {service_host})")
+    parser.add_argument("--port", type=int, default=service_port, help=f"port to listen on (default: {service_port})")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of a port")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write workbooks to (default: current directory)")
+    parser.add_argument("--pdf-backend", choices=['file'] + list(BACKENDS), default=pdf_backend,
+                        help=f"how pdfs are turned into text, as for college_academics.py (default: {pdf_backend})")
+    parser.add_argument("--poll", type=float, default=service_poll_seconds,
+                        help=f"seconds between checks of the data directory (default: {service_poll_seconds})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.directory):
+        print(f"Could not find directory '{args.directory}'")
+        sys.exit(1)
+    if args.socket and os.path.lexists(args.socket) and not is_socket(args.socket):
+        print(f"'{args.socket}' exists and is not a socket, not replacing it")
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    service = Service(args.directory, args.pdf_backend, args.output_dir)
+    if args.socket:
+        server = UnixHTTPServer(args.socket, Handler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), Handler)
+        where = f"http://{args.host}:{server.server_port}"
+    server.service = service
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=service.watch, args=(args.poll, stop), daemon=True)
+    watcher.start()
+    print(f"Serving {args.directory} on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if args.socket and is_socket(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Shared base of the SQLite stores kept by college_academics.py (results_db.py, history.py)
+# Makes the tables of a new file, upgrades files from older versions and refuses any other
+# version, with the version stored as the database's user_version. Every store has a meta
+# table of facts about its data, like the data_cache.data_fingerprint it was saved from
+
+import sqlite3
+
+# added to both stores in their version 2
+META_SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class SQLiteStore:
+    # set by each store: VERSION, SCHEMA (every table of a new file, META_SCHEMA included),
+    # UPGRADES {version: script that upgrades it to the next version}, KIND for messages
+    VERSION = None
+    SCHEMA = None
+    UPGRADES = {}
+    KIND = "database"
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            with self.conn:
+                self.conn.executescript(self.SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {self.VERSION}")
+            return
+        while version < self.VERSION and version in self.UPGRADES:
+            with self.conn:
+                self.conn.executescript(self.UPGRADES[version])
+                version += 1
+                self.conn.execute(f"PRAGMA user_version = {version}")
+        if version != self.VERSION:
+            self.conn.close()
+            raise ValueError(f"{path} has {self.KIND} version {version}, expected {self.VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # fingerprint of the data last saved, None if unknown
+    def fingerprint(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        return row and row[0]
+
+    # store the fingerprint of the data being saved, None if unknown
+    # called inside the transaction that saves the data, so both change together
+    def set_fingerprint(self, fingerprint):
+        if fingerprint is None:
+            self.conn.execute("DELETE FROM meta WHERE key = 'fingerprint'")
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
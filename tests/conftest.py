@@ -0,0 +1,7 @@
+# the modules under test are top level modules in the repository root, the reference
+# parser and synthetic transcripts come from benchmarks/
+import os, sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+sys.path.insert(0, root)
@@ -0,0 +1,116 @@
+# Random students dicts and transcripts for the equivalence tests, with the awkward cases
+# made common: marks drawn from a few values so wams and marks tie, zero marks (and 0.0
+# wams), ungraded courses, terms with nothing graded and summer terms
+
+import random
+from config import *
+import synthetic
+
+TERMS = ["2018 SUMMER SEMESTER", "2018 SEMESTER 2", "2019 SUMMER TERM", "2019 TERM 1", "2019 TERM 3"]
+MARKS = ['0', '00', '45', '59', '60', '75', '85', '99']
+GRADE_NAMES = ["HIGH DISTINCTION", "DISTINCTION", "PASS", "FAIL", "ABSENT FAIL", "SATISFACTORY", "-"]
+CODES = [("COMP", "1511"), ("COMP", "2521"), ("MATH", "1131"), ("PHYS", "1121")]
+
+def random_course(rng):
+    code, num = rng.choice(CODES)
+    grade = rng.choice(MARKS) if rng.random() < 0.8 else '-'
+    return Course(code, num, f"COURSE {code}{num}", grade, rng.choice(GRADE_NAMES))
+
+# dict of zid:Student, wams not processed
+def random_students(rng, n=None, terms=TERMS):
+    students = {}
+    for i in range(rng.randint(0, 12) if n is None else n):
+        zid = str(5000000 + i)
+        student = Student(f"First{i} LAST{i}", zid, "BASS")
+        for term in rng.sample(terms, rng.randint(0, len(terms))):
+            kind = rng.random()
+            if kind < 0.1:
+                # term wam of 0.0
+                courses = [Course("COMP", "1511", "ZERO", rng.choice(('0', '00')), "FAIL") for _ in range(rng.randint(1, 2))]
+            elif kind < 0.15:
+                # nothing graded
+                courses = [Course("COMP", "1000", "UNGRADED", '-', "SATISFACTORY")]
+            else:
+                courses = [random_course(rng) for _ in range(rng.randint(1, 4))]
+            for course in courses:
+                student.addCourse(term, course)
+        students[zid] = student
+    return students
+
+def process_wams(students):
+    for student in students.values():
+        student.process_wams()
+    return students
+
+# get_statistics as the baseline wrote it, with 'wam is not None' as the test for a wam
+def reference_statistics(students, term):
+    total_wam = 0
+    wam_count = 0
+    top_wam = [('<None>', 0)]
+    top_sub = [('<None>', '<None>', 0)]
+    full_hd = []
+    also_wam = None
+    under_perf = {}
+
+    for zid in students:
+        if term not in students[zid].terms.keys():
+            continue
+        t_wam = top_wam[0][1]
+        wam = students[zid].wams[term]
+        if wam is not None:
+            if wam > t_wam:
+                top_wam.clear()
+            if wam >= t_wam:
+                top_wam.append((zid, wam))
+            wam_count += 1
+            total_wam += wam
+
+        hd_count = 0
+        fail_count = 0
+        for sub in students[zid].terms[term]:
+            t_sub = top_sub[0][2]
+            if sub.hasGrade():
+                grade = sub.mark
+                if grade >= t_sub:
+                    if zid in [item for tup in top_wam for item in tup]:
+                        if not also_wam or grade > also_wam[2]:
+                            also_wam = (zid, sub.code + ' ' + sub.name, grade)
+                    else:
+                        if grade > t_sub:
+                            top_sub.clear()
+                        top_sub.append((zid, sub.code + ' ' + sub.name, grade))
+            if sub.grade_name.upper() == "HIGH DISTINCTION":
+                hd_count += 1
+            elif sub.grade_name.upper() in ("FAIL", "ABSENT FAIL", "UNSATISFACTORY FAIL", "ACADEMIC WITHDRAWAL"):
+                fail_count += 1
+
+        if hd_count >= 2:
+            full_hd.append((zid, hd_count, len(students[zid].terms[term])))
+        if fail_count or (wam is not None and wam < 60):
+            under_perf[zid] = students[zid].terms[term]
+
+    if len(top_wam) > 1 and top_wam[0][0] == '<None>':
+        del top_wam[0]
+    if top_sub[0][0] == '<None>':
+        top_sub.clear()
+    if also_wam and also_wam[0] in [item for tup in top_wam for item in tup]:
+        top_sub.insert(0, also_wam)
+
+    college_stats = {'avg_wam': total_wam/wam_count} if wam_count > 0 else {'avg_wam': None}
+    return college_stats, {'top_wam': top_wam, 'top_sub': top_sub, 'full_hd': full_hd}, under_perf
+
+# lines of a random pdftotext -layout transcript as benchmarks/synthetic.py writes them,
+# with marks from MARKS (or none), summer terms and short pages so name lines repeat
+def random_transcript(rng, n=None):
+    lines = []
+    for i in range(rng.randint(0, 8) if n is None else n):
+        for line in synthetic.student_lines(rng, 5000000 + i, rng.randint(0, 8), rng.randint(0, 4), rng.randint(6, 30)):
+            if line[:4].isalpha() and line[4:8].isdecimal():
+                # a course line, the mark is right-aligned in the 6 columns before the grade name
+                mark = rng.choice(MARKS) if rng.random() < 0.8 else ''
+                line = line[:66] + f"{mark:>6}" + line[72:]
+            lines.append(line)
+    return lines
+
+def seeds(n):
+    return [random.Random(seed) for seed in range(n)]
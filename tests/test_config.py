@@ -0,0 +1,90 @@
+# config.Term, convert_term_name and term_sort_key against the regex versions they replaced
+
+import re
+from config import *
+from sample_data import seeds
+
+# convert_term_name before Term
+def reference_convert(term_string):
+    term_string = term_string.strip()
+    if re.match(r"(?i)^\d\d[ST][0123]$", term_string) is not None:
+        year = "20" + term_string[:2]
+        term_sem = "SEMESTER" if term_string[2].upper() == "S" else "TERM"
+        if term_string[-1] == "0":
+            return f"{year} SUMMER {term_sem}"
+        return f"{year} {term_sem} {term_string[-1]}"
+    elif re.match(r"(?i)^\d{4} (?:TERM|SEMESTER) [0123]$", term_string) is not None or \
+         re.match(r"(?i)^\d{4} SUMMER (?:TERM|SEMESTER)$", term_string) is not None:
+        term_split = re.split(' ', term_string)
+        if term_split[1].lower() == "summer":
+            term_split[1] = "0"
+            term_split.append(term_split.pop(1))
+        return term_split[0][-2:] + term_split[1][0].upper() + term_split[2]
+    return None
+
+# term_sort_key before Term, for term names
+def reference_sort_key(term_string):
+    code = reference_convert(term_string)
+    if code is None:
+        return (0, 0, term_string)
+    return (int(code[:2]), int(code[-1]), term_string)
+
+PIECES = ["19", "2019", "99", "2000", "１９", "T", "t", "S", "s", "X", "0", "1", "3", "4",
+          "TERM", "Term", "SEMESTER", "semester", "SUMMER", "Summer", "FALL", " ", "  ", "\t", ""]
+
+# random strings made of term name and code pieces, most of them close to a term
+def random_term(rng):
+    year = rng.choice(("19", "22", "2019", "2022", "1999", "１９", "9", ""))
+    kind = rng.random()
+    if kind < 0.3:
+        parts = [year, rng.choice("TtSsX"), rng.choice("01234")]
+        sep = ""
+    elif kind < 0.6:
+        parts = [year, rng.choice(("TERM", "Term", "SEMESTER", "semester", "TRIMESTER")), rng.choice("01234")]
+        sep = rng.choice((" ", " ", "  "))
+    elif kind < 0.8:
+        parts = [year, rng.choice(("SUMMER", "Summer", "WINTER")), rng.choice(("TERM", "SEMESTER", "term", "T"))]
+        sep = rng.choice((" ", " ", "  "))
+    else:
+        parts = [rng.choice(PIECES) for _ in range(rng.randint(0, 4))]
+        sep = rng.choice(("", " "))
+    return rng.choice(("", " ", "\t")) + sep.join(parts) + rng.choice(("", " ", "\n"))
+
+def test_terms_match_reference():
+    for rng in seeds(20):
+        for _ in range(1000):
+            term = random_term(rng)
+            assert convert_term_name(term) == reference_convert(term), repr(term)
+            name = reference_convert(term) if len(term.strip()) == 4 else term
+            if name is not None:
+                assert term_sort_key(name) == reference_sort_key(name), repr(name)
+
+def test_term_order():
+    names = ["2018 SUMMER SEMESTER", "2018 SEMESTER 1", "2018 SEMESTER 2", "2019 SUMMER TERM",
+             "2019 TERM 1", "2019 TERM 2", "2019 TERM 3", "2020 SUMMER TERM", "2020 TERM 1"]
+    for rng in seeds(20):
+        shuffled = rng.sample(names, len(names))
+        assert sorted(shuffled, key=term_sort_key) == names
+    # a code sorts with its name, and Term.get gives the same Term for the same string
+    for name in names:
+        code = convert_term_name(name)
+        assert term_sort_key(code)[:2] == term_sort_key(name)[:2]
+        assert Term.get(code).name == name and Term.get(name).code == code
+        assert Term.get(name) is Term.get(name)
+
+def test_term_identity():
+    # a name in any case and its code, with or without spaces around, are the same Term
+    for code, names in [("22T3", ["2022 TERM 3", "2022 Term 3", " 2022 term 3\n", "22t3"]),
+                        ("19S0", ["2019 SUMMER SEMESTER", "2019 Summer Semester", "19s0"])]:
+        term = Term.get(code)
+        for name in names:
+            assert Term.get(name) == term and Term.get(name) is term
+            assert hash(Term.get(name)) == hash(term)
+        assert term.name == names[0] and term.code == code
+    assert Term.get("22T3") != Term.get("22S3") and Term.get("22T3") != Term.get("21T3")
+    assert Term.get("22T3") != "22T3"
+    # the same Term once get's cache has been cleared
+    term = Term.get("2022 TERM 3")
+    Term.get.cache_clear()
+    assert Term.get("22T3") is term
+    assert len({Term.get(code) for code in ("22T3", "2022 TERM 3", "22T1", "2022 Term 1")}) == 2
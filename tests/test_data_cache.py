@@ -0,0 +1,107 @@
+# data_cache.wam_sums against the term wams it sums, the columnar cache against the
+# transcripts it was saved from, and statistics.py without a cache to read
+
+import os
+import random
+import pytest
+from config import *
+import data_cache
+from data_cache import *
+from college_academics import update_entries, parse_file
+from statistics import load_college_wams
+from sample_data import TERMS, random_students, random_transcript, process_wams, seeds
+
+def test_wam_sums_match_wams():
+    for rng in seeds(500):
+        students = process_wams(random_students(rng))
+        sums = wam_sums(students.values())
+        for term in TERMS:
+            wams = [s.wams[term] for s in students.values() if term in s.terms and s.wams[term] is not None]
+            if term not in sums:
+                assert not wams
+                continue
+            assert sums[term][1] == len(wams)
+            assert sums[term][0] == sum(round(w * 10) for w in wams)
+
+        # taking a student away leaves the sums of the others
+        if students:
+            zid = rng.choice(list(students))
+            add_sums(sums, wam_sums([students[zid]], sign=-1))
+            rest = wam_sums(s for s in students.values() if s.zid != zid)
+            assert {t: agg for (t, agg) in sums.items() if t in rest} == rest
+
+def test_zero_wam_is_counted():
+    students = {}
+    for zid, mark in (("5000001", '0'), ("5000002", '75')):
+        students[zid] = Student("First LAST", zid, "BASS")
+        students[zid].addCourse(TERMS[0], Course("COMP", "1511", "PROGRAMMING", mark, "-"))
+    assert wam_sums(students.values()) == {TERMS[0]: [750, 2]}
+
+# a directory of random transcript txt files, one per college
+def write_transcripts(directory, rng):
+    for i, college in enumerate(("Basser", "IH", "FTH")):
+        with open(os.path.join(directory, f"{college} Transcripts.txt"), 'w') as f:
+            f.writelines(random_transcript(rng, rng.randint(0, 6)))
+
+def snapshot(entries):
+    return {path: (e.size, e.mtime, e.digest, e.college, repr(e.students), e.terms, e.sums) for (path, e) in entries.items()}
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    for rng in seeds(20):
+        write_transcripts("data", rng)
+        entries, parsed, changed = update_entries("data", {}, 'file')
+        assert parsed and changed
+        with open_cache() as cache:
+            assert snapshot(read_entries(cache)) == snapshot(entries)
+        # and the same as parsing the files again
+        fresh = {path: parse_file(txt_path(path), entry.college) for (path, entry) in entries.items()}
+        assert {path: (repr(e.students), e.terms) for (path, e) in load_file_cache().items()} == \
+               {path: (repr(students), terms) for (path, (students, terms)) in fresh.items()}
+
+def test_cache_version_mismatch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    write_transcripts("data", random.Random(0))
+    monkeypatch.setattr(data_cache, 'CACHE_VERSION', data_cache.CACHE_VERSION + 1)
+    update_entries("data", {}, 'file')
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FormatError, match="schema version"):
+        open_cache()
+    assert load_file_cache() == {}
+
+def test_truncated_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    write_transcripts("data", random.Random(1))
+    update_entries("data", {}, 'file')
+    with open(FILE_CACHE, 'rb') as f:
+        data = f.read()
+    for size in sorted(set(random.Random(2).sample(range(len(data)), 50)) | {0, 8, len(data) - 1}):
+        with open(FILE_CACHE, 'wb') as f:
+            f.write(data[:size])
+        with pytest.raises(FormatError):
+            open_cache()
+        assert load_file_cache() == {}
+
+def test_old_pickles_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    write_transcripts("data", random.Random(3))
+    os.mkdir(CACHE_DIR)
+    for old in OLD_CACHES:
+        open(old, 'wb').close()
+    with pytest.raises(FormatError, match="old format"):
+        open_cache()
+    update_entries("data", {}, 'file')
+    assert not any(os.path.exists(old) for old in OLD_CACHES)
+
+def test_statistics_without_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as excinfo:
+        load_college_wams()
+    assert excinfo.value.code == 1
+    out, err = capsys.readouterr()
+    assert out == "" and "Failed to read cached data" in err
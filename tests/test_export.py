@@ -0,0 +1,97 @@
+# workbook and table exports of college_academics.py
+
+import os
+import copy
+import random
+from config import *
+from openpyxl import Workbook, load_workbook
+from profiling import profiler
+from transcript import iter_students
+import college_academics
+from college_academics import export_data, export_to_excel
+from sample_data import random_transcript, random_students, process_wams, seeds
+
+FILES = {"BASS": "Basser Transcripts.txt", "COLH": "Colombo Transcripts.txt", "IH": "IH Transcripts.txt"}
+
+def cells(ws):
+    return [[cell.value for cell in row] for row in ws.iter_rows()]
+
+# (sheet name, cells) of every sheet in order
+def workbook_cells(filename):
+    return [(ws.title, cells(ws)) for ws in load_workbook(filename).worksheets]
+
+# students with their wams worked out as they pass through
+def with_wams(students):
+    for student in students:
+        student.process_wams()
+        yield student
+
+def test_export_data_takes_any_iterable():
+    rng = random.Random(0)
+    lines = random_transcript(rng, 6)
+    students = process_wams({s.zid: s for s in iter_students(lines, "IH")})
+    term = next(t for s in students.values() for t in s.terms)
+    expected = Workbook().active
+    export_data(expected, students, term)
+
+    profiler.enable(trace_memory=False)
+    try:
+        ws = Workbook().active
+        export_data(ws, with_wams(iter_students(lines, "IH")), term)
+        stage = profiler.take()[-1]
+    finally:
+        profiler.enabled = False
+    assert cells(ws) == cells(expected)
+    assert stage['stage'] == 'export_data' and stage['counts']['students'] == 6
+
+# workbooks of every term written by main(argv) run in directory, by file name
+def run_main(directory, argv, monkeypatch):
+    os.makedirs(directory)
+    monkeypatch.chdir(directory)
+    college_academics.main(argv + ["-o", "out"])
+    return {name: workbook_cells(os.path.join("out", name)) for name in sorted(os.listdir("out")) if name.endswith(".xlsx")}
+
+def test_pipeline_matches_serial(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    os.makedirs(data)
+    for (college, name), rng in zip(FILES.items(), seeds(len(FILES))):
+        with open(data / name, 'w', encoding='utf-8') as f:
+            f.writelines(random_transcript(rng, 15))
+    argv = [str(data), "-t", "18S1..20T1"]
+
+    serial = run_main(tmp_path / "serial", argv, monkeypatch)
+    assert len(serial) == 8
+    assert run_main(tmp_path / "pipeline", argv + ["--pipeline"], monkeypatch) == serial
+
+def test_unchanged_sheets_not_rewritten(tmp_path, capsys):
+    term = "2019 TERM 1"
+    rng = random.Random(1)
+    college_data = {}
+    for college in ("BASS", "COLH"):
+        students = process_wams(random_students(rng, 10))
+        for student in students.values():
+            student.college = college
+        college_data[college] = students
+    filename = str(tmp_path / "College_Academics_19T1.xlsx")
+    export_to_excel(filename, college_data, term)
+    st = os.stat(filename)
+    capsys.readouterr()
+
+    # the same data again, in new objects: every sheet's fingerprint matches, the file is left alone
+    export_to_excel(filename, copy.deepcopy(college_data), term)
+    out = capsys.readouterr().out
+    assert "Unchanged BASS" in out and "Unchanged COLH" in out and "Unchanged ALL" in out
+    assert f"No changes to {filename}" in out
+    assert (os.stat(filename).st_mtime_ns, os.stat(filename).st_size) == (st.st_mtime_ns, st.st_size)
+
+    # a new course for a COLH student rewrites COLH and ALL (where the COLH students of zids
+    # in both colleges are), BASS's sheets are kept
+    student = next(s for s in college_data["COLH"].values() if term in s.terms)
+    student.addCourse(term, Course("COMP", "1511", "NEW", "99", "HIGH DISTINCTION"))
+    student.process_wams()
+    export_to_excel(filename, college_data, term)
+    out = capsys.readouterr().out
+    assert "Unchanged BASS" in out and "Exporting COLH" in out and "Exporting ALL" in out
+    fresh = str(tmp_path / "fresh.xlsx")
+    export_to_excel(fresh, college_data, term)
+    assert workbook_cells(filename) == workbook_cells(fresh)
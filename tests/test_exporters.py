@@ -0,0 +1,62 @@
+# exporters.py csv and jsonl tables read back against the records they were written from
+
+import csv
+import json
+from config import *
+import exporters
+from data_cache import wam_sums
+from college_academics import college_statistics
+from sample_data import random_students, process_wams, seeds
+
+COLLEGES = ["BASS", "COLH"]
+
+def random_college_data(rng):
+    college_data = {}
+    for college in COLLEGES:
+        students = process_wams(random_students(rng, rng.randint(0, 15)))
+        for student in students.values():
+            student.college = college
+            # names that need quoting, and outside ascii
+            if rng.random() < 0.3:
+                student.first_names = rng.choice(('Zoë "Jo", Ann', "O'Brien,\tSam", 'Wei\nMing'))
+        college_data[college] = students
+    return college_data
+
+# {table: (columns, records)} of what export_term_tables and export_wams write, and the
+# college statistics the stats table is written from
+def expected_tables(college_data, term):
+    stats = {college: college_statistics(students, term) for college, students in college_data.items()}
+    return {
+        'students': (exporters.STUDENT_COLUMNS, [record for students in college_data.values()
+                                                 for record in exporters.student_records(students, term)]),
+        'stats': (exporters.STATS_COLUMNS, [record for college, students in college_data.items()
+                                            for record in exporters.stats_records(college, students, term, *stats[college])]),
+        'wams': (exporters.WAM_COLUMNS, list(exporters.wam_records(
+            {college: wam_sums(students.values()) for college, students in college_data.items()}))),
+    }, stats
+
+def write_tables(base, fmt, college_data, term, stats):
+    paths = exporters.export_term_tables(base, fmt, college_data, term, stats)
+    paths.append(exporters.export_wams(base, fmt, {college: wam_sums(students.values()) for college, students in college_data.items()}))
+    return dict(zip(('students', 'stats', 'wams'), paths))
+
+def test_csv_and_jsonl_round_trip(tmp_path):
+    for i, rng in enumerate(seeds(50)):
+        college_data = random_college_data(rng)
+        term = rng.choice(("2018 SEMESTER 2", "2019 TERM 1", "2019 TERM 3"))
+        tables, stats = expected_tables(college_data, term)
+
+        # csv: a header of the columns, then every field as text, None as empty
+        paths = write_tables(str(tmp_path / f"csv{i}"), 'csv', college_data, term, stats)
+        for table, (columns, records) in tables.items():
+            with open(paths[table], newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+            assert rows[0] == list(columns)
+            assert rows[1:] == [['' if value is None else str(value) for value in record] for record in records]
+
+        # jsonl: an object per record, keyed by column, with numbers and nulls kept
+        paths = write_tables(str(tmp_path / f"jsonl{i}"), 'jsonl', college_data, term, stats)
+        for table, (columns, records) in tables.items():
+            with open(paths[table], encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+            assert rows == [dict(zip(columns, record)) for record in records]
@@ -0,0 +1,37 @@
+# history.HistoryIndex running wam sums against calculate_wams on the data drops it was given
+
+import copy
+from config import *
+from history import HistoryIndex
+from college_academics import calculate_wams
+from sample_data import random_students, seeds
+
+# students of later drops replace the terms they have, the others keep their earlier ones
+def merge_drops(drops):
+    merged = {}
+    for drop in drops:
+        for zid, student in drop.items():
+            if zid not in merged:
+                merged[zid] = copy.deepcopy(student)
+                merged[zid].wams = {}
+            else:
+                merged[zid].terms.update(copy.deepcopy(student.terms))
+    return merged
+
+def test_overall_wam_matches_calculate_wams(tmp_path):
+    for i, rng in enumerate(seeds(200)):
+        drops = []
+        with HistoryIndex(str(tmp_path / f"history{i}.db")) as index:
+            for _ in range(rng.randint(1, 3)):
+                drop = random_students(rng)
+                calculate_wams({"BASS": drop})
+                index.update({"BASS": drop})
+                drops.append(drop)
+
+            merged = merge_drops(drops)
+            calculate_wams({"BASS": merged})
+            assert len(index) == len(merged)
+            for zid, student in merged.items():
+                assert index.overall_wam(zid) == student.overall_wam
+                assert [(term, wam) for (term, _, wam, _) in index.trend(zid)] == \
+                       sorted(student.wams.items(), key=lambda item: term_sort_key(item[0]))
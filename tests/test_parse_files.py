@@ -0,0 +1,39 @@
+# college_academics.parse_files with a process pool against parsing the files one by one
+
+import os
+from config import *
+from profiling import profiler
+from college_academics import parse_files
+from sample_data import random_transcript, seeds
+
+COLLEGES = ["BASS", "COLH", "FTH", "IH"]
+
+def parse(files, workers, texts=None):
+    return [(repr(students), terms) for (students, terms) in parse_files(files, workers, texts)]
+
+def test_pool_matches_serial(tmp_path):
+    files = []
+    texts = []
+    for college, rng in zip(COLLEGES, seeds(len(COLLEGES))):
+        path = os.path.join(tmp_path, f"{college}.txt")
+        lines = random_transcript(rng, 20)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        files.append((path, college))
+        # every other file as text already extracted from a pdf
+        texts.append("".join(lines) if len(files) % 2 else None)
+
+    expected = parse(files, 1)
+    assert parse(files, 3) == expected
+    assert parse(files, 3, texts) == expected
+
+    # the workers' profiler stages come back, in file order
+    profiler.enable(trace_memory=False)
+    try:
+        parse_files(files, 1)
+        serial = [(stage['college'], stage['counts']) for stage in profiler.take()]
+        parse_files(files, 3)
+        pooled = [(stage['college'], stage['counts']) for stage in profiler.take()]
+    finally:
+        profiler.enabled = False
+    assert pooled == serial and [college for (college, _) in serial] == COLLEGES
@@ -0,0 +1,66 @@
+# ranking.TermRanking against the baseline get_statistics, and its queries against brute force
+
+from config import *
+from ranking import TermRanking
+from college_academics import get_statistics
+from sample_data import TERMS, random_students, process_wams, reference_statistics, seeds
+
+def test_statistics_match_reference():
+    for rng in seeds(2000):
+        students = process_wams(random_students(rng))
+        for term in TERMS:
+            assert TermRanking(students, term).statistics() == reference_statistics(students, term)
+            assert get_statistics(students, term) == reference_statistics(students, term)
+
+def test_zero_wam_is_a_wam():
+    students = {}
+    for zid, mark, grade_name in (("5000001", '0', "ABSENT"), ("5000002", '75', "DISTINCTION")):
+        students[zid] = Student("First LAST", zid, "BASS")
+        students[zid].addCourse(TERMS[0], Course("COMP", "1511", "PROGRAMMING", mark, grade_name))
+    process_wams(students)
+
+    ranking = TermRanking(students, TERMS[0])
+    college_stats, high_perf, under_perf = ranking.statistics()
+    assert college_stats['avg_wam'] == 37.5
+    assert list(under_perf) == ["5000001"]
+    assert ranking.rank("5000001") == 2
+    assert ranking.percentile("5000002") == 50
+
+# first k rows of a sorted list, plus any tied with the k-th on key
+def first_k(rows, key, k):
+    if k is None or k >= len(rows):
+        return rows
+    return [row for row in rows if key(row) >= key(rows[k - 1])] if k > 0 else []
+
+def test_queries_match_brute_force():
+    for rng in seeds(500):
+        students = process_wams(random_students(rng))
+        for term in TERMS:
+            ranking = TermRanking(students, term)
+            enrolled = [(zid, s) for (zid, s) in students.items() if term in s.terms]
+            wams = [(zid, s.wams[term]) for (zid, s) in enrolled if s.wams[term] is not None]
+            by_wam = sorted(wams, key=lambda row: -row[1])
+            rows = [(zid, c.code, c.code + ' ' + c.name, c.mark) for (zid, s) in enrolled for c in s.terms[term] if c.hasGrade()]
+            codes = list(dict.fromkeys(code for (_, code, _, _) in rows))
+            hds = sorted(((zid, sum(c.grade_name.upper() == "HIGH DISTINCTION" for c in s.terms[term]), len(s.terms[term])) for (zid, s) in enrolled),
+                         key=lambda row: -row[1])
+
+            for k in (None, 0, 1, 2, 5):
+                assert ranking.top_wam(k) == first_k(by_wam, lambda row: row[1], k)
+                assert ranking.most_hds(k or 1) == first_k([row for row in hds if row[1]], lambda row: row[1], k or 1)
+                assert ranking.top_subjects(k or 1) == first_k(sorted([(z, sub, m) for (z, _, sub, m) in rows], key=lambda row: (-row[2], codes.index(row[1][:8]))),
+                                                               lambda row: row[2], k or 1)
+                for code in codes:
+                    course = sorted([(z, sub, m) for (z, c, sub, m) in rows if c == code], key=lambda row: -row[2])
+                    assert ranking.top_course(code, k) == first_k(course, lambda row: row[2], k)
+
+            for (zid, wam) in wams:
+                assert ranking.rank(zid) == 1 + sum(other > wam for (_, other) in wams)
+                assert ranking.percentile(zid) == 100 * sum(other < wam for (_, other) in wams) / len(wams)
+                for code in codes:
+                    marks = [m for (z, c, _, m) in rows if c == code]
+                    best = max((m for (z, c, _, m) in rows if c == code and z == zid), default=None)
+                    assert ranking.course_rank(zid, code) == (None if best is None else 1 + sum(m > best for m in marks))
+            for (zid, s) in enrolled:
+                if s.wams[term] is None:
+                    assert ranking.rank(zid) is None and ranking.percentile(zid) is None
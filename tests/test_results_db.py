@@ -0,0 +1,70 @@
+# results_db.ResultsDB queries against walks over the college_data they were saved from
+
+from config import *
+from results_db import ResultsDB
+from data_cache import wam_sums, MergedView
+from sample_data import random_students, process_wams, seeds
+
+COLLEGES = ["BASS", "COLH", "IH"]
+
+# college_data of random students, with the same zids in several colleges
+def random_college_data(rng):
+    college_data = {}
+    for college in rng.sample(COLLEGES, rng.randint(1, len(COLLEGES))):
+        students = process_wams(random_students(rng))
+        for student in students.values():
+            student.college = college
+        college_data[college] = students
+    return college_data
+
+def walk_courses(college_data, term=None, subject=None, college=None, fails=False):
+    found = []
+    for name, students in college_data.items():
+        for zid, student in students.items():
+            for enrol_term, courses in student.terms.items():
+                for course in courses:
+                    if term is not None and enrol_term != term or \
+                       subject is not None and not course.code.startswith(subject) or \
+                       college is not None and name != college or \
+                       fails and course.grade_name.upper() not in FAIL_GRADES:
+                        continue
+                    found.append((zid, name, enrol_term, repr(course)))
+    return found
+
+def terms_of(college_data):
+    return sorted({term for students in college_data.values() for s in students.values() for term in s.terms})
+
+def sums(totals):
+    return {term: tuple(agg) for term, agg in totals.items()}
+
+def test_queries_match_college_data():
+    for rng in seeds(100):
+        college_data = random_college_data(rng)
+        with ResultsDB(":memory:") as db:
+            db.save(college_data)
+            assert db.colleges() == sorted(college for college, students in college_data.items() if students)
+
+            for college, students in college_data.items():
+                assert repr(db.students(college)) == repr(students)
+                assert sums(wam_sums(students.values())) == db.wam_sums(college)
+                for term in db.terms():
+                    loaded = db.students(college, term)
+                    assert list(loaded) == [zid for zid, s in students.items() if term in s.terms]
+                    for zid, student in loaded.items():
+                        assert list(student.terms) == [term]
+                        assert repr(student.terms[term]) == repr(students[zid].terms[term])
+                        assert student.wams == {term: students[zid].wams[term]}
+            assert db.wam_sums() == sums(wam_sums(MergedView(college_data.values()).values()))
+
+            for zid in {zid for students in college_data.values() for zid in students}:
+                assert db.student_history(zid) == [(college, term, wam)
+                                                   for college, students in college_data.items() if zid in students
+                                                   for term, wam in students[zid].wams.items()]
+
+            for _ in range(10):
+                filters = dict(term=rng.choice([None] + terms_of(college_data)),
+                               subject=rng.choice((None, "COMP", "COMP2", "MATH1131", "X")),
+                               college=rng.choice([None] + COLLEGES),
+                               fails=rng.random() < 0.5)
+                found = [(zid, college, term, repr(course)) for (zid, college, term, course) in db.find_courses(**filters)]
+                assert found == walk_courses(college_data, **filters), filters
@@ -0,0 +1,69 @@
+# transcript.parse_lines against the parser it replaced, the mmap from open_transcript
+# against reading the file with open(), and iter_students streaming students as it reads
+
+import os
+from config import *
+from transcript import parse_lines, open_transcript, iter_students
+from bench_parse import legacy_parse_lines, Lines
+from sample_data import random_transcript, seeds
+
+def parse(fp):
+    terms = set()
+    students = parse_lines(fp, "BASS", terms)
+    return repr(students), terms
+
+def test_parse_lines_match_legacy():
+    for rng in seeds(500):
+        lines = random_transcript(rng)
+        terms = set()
+        expected = repr(legacy_parse_lines(Lines(lines), "BASS", terms)), terms
+        assert parse(Lines(lines)) == expected
+
+# line with whitespace outside ascii after the first space of its indent (or of a new
+# indent for a course line), so the bytes prefilter can't tell it apart by its start
+def indent(rng, line):
+    space = rng.choice(('\u00a0', '\u2003', '\x1f'))
+    if line[:4].isalpha() and line[4:8].isdecimal():
+        return ' ' + space * 2 + line
+    if line[:2] == '  ':
+        return ' ' + space + line[2:]
+    return line
+
+def test_mmap_matches_open(tmp_path):
+    path = os.path.join(tmp_path, "BASS.txt")
+    for rng in seeds(200):
+        lines = random_transcript(rng)
+        kind = rng.random()
+        if kind < 0.2:
+            # line endings of a file not from pdftotext
+            lines = [line.replace('\n', '\r\n') for line in lines]
+        elif kind < 0.4:
+            # names and course names outside ascii
+            lines = [line.replace('Wei', 'Zoë').replace('DATA', 'DAТА') for line in lines]
+        elif kind < 0.6:
+            # terms and courses indented with whitespace outside ascii, which \s matches
+            lines = [indent(rng, line) for line in lines]
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines)
+        with open(path, encoding='utf-8') as f:
+            expected = parse(f)
+        with open_transcript(path) as source:
+            assert parse(source) == expected
+
+def test_iter_students_streams():
+    for rng in seeds(50):
+        lines = random_transcript(rng, rng.randint(2, 6))
+        read = []
+        def source():
+            for line in lines:
+                read.append(line)
+                yield line
+
+        students = parse_lines(Lines(lines), "BASS", set())
+        # each student comes out once the next one's name line is read, not at the end
+        for i, student in enumerate(iter_students(source(), "BASS")):
+            assert repr(student) == repr(students[student.zid])
+            if i < len(students) - 1:
+                assert len(read) < len(lines)
+                assert f"({student.zid})" not in read[-1] and " (" in read[-1]
+        assert len(read) == len(lines)
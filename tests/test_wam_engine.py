@@ -0,0 +1,43 @@
+# wam_engine.WamEngine against Student.process_wams and get_statistics
+
+import random
+import pytest
+from config import *
+from college_academics import get_statistics
+from sample_data import TERMS, random_students, process_wams, seeds
+
+wam_engine = pytest.importorskip("wam_engine")
+if not wam_engine.available:
+    pytest.skip("numpy is not installed", allow_module_level=True)
+
+def test_wams_match_process_wams():
+    for seed in range(1000):
+        # the same students twice, one set for the engine and one for process_wams
+        students = random_students(random.Random(seed))
+        expected = process_wams(random_students(random.Random(seed)))
+        wam_engine.WamEngine(students).apply_wams()
+        for zid, student in students.items():
+            assert student.wams == expected[zid].wams
+            assert student.overall_wam == expected[zid].overall_wam
+
+def test_statistics_match_get_statistics():
+    for rng in seeds(3000):
+        students = process_wams(random_students(rng))
+        engine = wam_engine.WamEngine(students)
+        for term in TERMS + ["2020 TERM 1"]:
+            assert engine.statistics(term) == get_statistics(students, term)
+
+def test_zero_wam_is_a_wam():
+    students = {}
+    for zid, mark in (("5000001", '00'), ("5000002", '75')):
+        students[zid] = Student("First LAST", zid, "BASS")
+        students[zid].addCourse(TERMS[2], Course("COMP", "1511", "PROGRAMMING", mark, "PASS"))
+    process_wams(students)
+    college_stats, high_perf, under_perf = wam_engine.WamEngine(students).statistics(TERMS[2])
+    assert college_stats['avg_wam'] == 37.5
+    assert list(under_perf) == ["5000001"]
+
+    # everyone on 0.0: the top wam is a real student, not the placeholder
+    del students["5000002"]
+    assert wam_engine.WamEngine(students).statistics(TERMS[2])[1]['top_wam'] == [("5000001", 0.0)]
+    assert get_statistics(students, TERMS[2])[1]['top_wam'] == [("5000001", 0.0)]
@@ -0,0 +1,143 @@
+# Transcript parsing for college_academics.py
+# Turns pdftotext -layout output into Student objects
+
+import io
+import sys
+import re
+import mmap
+from contextlib import contextmanager
+from config import *
+
+# patterns for regex, compiled once
+# name_zid is searched anywhere in the line, the rest are anchored to the start
+NAME_ZID = re.compile(r'\W?([\w\-\.\' ]+) \((\d{7})\)')
+TYPE_PROGRAM = re.compile(r'(?i)^([\w\-]+)\s{5,}(\d{4}\s+\w.*)$')
+TERM = re.compile(r'(?i)^\s*((?:term|semester|summer).+?\d{4}\s*$)')
+COURSE = re.compile(r'(?i)^\s*(\w{4}) ?(\d{4})\s*')
+# course line fields once runs of 3+ whitespace are collapsed to '#'
+COURSE_TABS = re.compile(r'^#?(\w{4}) ?(\d{4})#?((?:[\w\d\:\.,\-\(\)]+ ?)+)#?(\d{2,3})?#?([\w ]+)?')
+WHITESPACE_RUN = re.compile(r'\s{3,}')
+
+# first letters (after leading whitespace) a term line can start with
+TERM_STARTS = ('t', 's')
+
+# lines of a bytes transcript that could match any of the patterns above: starting in the
+# first column (type_program), containing " (" (name_zid), starting with a term word or a
+# course code, or containing anything outside ascii, which is left to the str patterns
+CANDIDATE = re.compile(rb'''(?mx)^(?:
+      [^\s].*
+    | .*?(?:\ \(|[\x80-\xff\x1c-\x1f]).*
+    | [\ \t\f\v]*(?i:term|semester|summer).*
+    | [\ \t\f\v]*\w{4}\ ?\d{4}.*
+)\n?''')
+
+# decoded lines of a bytes-like transcript (e.g. an mmap of the txt file) that could match
+# a pattern, the rest are skipped inside the regex engine without being decoded
+def candidate_lines(buf):
+    if buf.find(b'\r') != -1:
+        # only seen in files not from pdftotext, read with universal newlines like open() does
+        return io.StringIO(bytes(buf).decode('utf-8'), newline=None)
+    return (match.group().decode('utf-8') for match in CANDIDATE.finditer(buf))
+
+# memory-map a transcript txt file for iter_students/parse_lines
+@contextmanager
+def open_transcript(path):
+    with open(path, 'rb') as f:
+        if not f.seek(0, io.SEEK_END):
+            # empty files can't be mapped
+            yield b''
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                # still used by the traceback of a failed parse, closed once that is freed
+                pass
+
+# generator of Student objects from an open txt file (or any iterable of lines), or from
+# the bytes of one, e.g. the mmap from open_transcript
+# each student is yielded once the next student's name line is reached, so only one
+# student is held in memory at a time. terms seen are added to all_terms if given
+def iter_students(fp, college, all_terms=None):
+    if all_terms is None:
+        all_terms = set()
+    if isinstance(fp, (bytes, bytearray, mmap.mmap)):
+        fp = candidate_lines(fp)
+
+    # bind hot lookups locally
+    name_zid = NAME_ZID.search
+    type_program = TYPE_PROGRAM.match
+    term_match = TERM.match
+    course_match = COURSE.match
+    course_tabs = COURSE_TABS.match
+    collapse = WHITESPACE_RUN.sub
+    college = college.strip()
+
+    #initialise object variable
+    student = None
+
+    # parse loop
+    # each check below is guarded by a cheap test on the line so that only
+    # the patterns that could match it are run
+    for line in fp:
+        # match name line, always contains " (zid)"
+        if ' (' in line:
+            match = name_zid(line)
+            if match:
+                zid = match.group(2).strip()
+
+                # skip if start of additional page for existing entry
+                if student and zid == student.zid:
+                    continue
+                elif student:
+                    yield student
+
+                #new student object
+                student = Student(match.group(1).strip(), zid, college)
+
+        # enrolment type and program, starts at the first column
+        if not line[:1].isspace():
+            match = type_program(line)
+            if match:
+                student.enrol_type = match.group(1).strip().title()
+                student.program = match.group(2).strip()
+
+        # process terms
+        head = line.lstrip()[:1].lower()
+        if head in TERM_STARTS:
+            match = term_match(line)
+            if match:
+                term = match.group().strip()
+                term = sys.intern(term[-4:] + " " + term[:-5])
+                all_terms.add(term)
+                if term not in student.terms:
+                    student.terms[term] = []
+
+        # process courses
+        if course_match(line):
+            match = course_tabs(collapse('#', line))
+
+            code_name = match.group(1)
+            code_num = match.group(2)
+            name = match.group(3)
+            grade = match.group(4)
+            grade_name = match.group(5)
+
+            grade = '' if not grade else grade
+            grade_name = '' if not grade_name else grade_name
+
+            course = Course(*map(str.strip, [code_name, code_num, name, grade, grade_name]))
+            student.addCourse(term, course)
+
+    if student:
+        yield student
+
+# parse a whole file into a dict of zid:Student
+def parse_lines(fp, college, all_terms):
+    students = {}
+    for student in iter_students(fp, college, all_terms):
+        students[student.zid] = student
+    return students
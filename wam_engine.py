@@ -0,0 +1,178 @@
+# Vectorised WAM and statistics engine for college_academics.py
+# Builds a flat marks table (one row per course) for a college's students dict and works out
+# wams, averages, top wam/subject ties, HD counts and underperformers with grouped numpy
+# operations. Results match Student.process_wams and get_statistics exactly.
+# numpy is optional: check wam_engine.available before using the engine
+
+from config import HD_GRADE, FAIL_GRADES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+available = np is not None
+
+# grade kinds in the marks table
+OTHER, HD, FAIL = 0, 1, 2
+
+class WamEngine:
+
+    def __init__(self, students):
+        self.students = students
+        self.zids = list(students)
+        self.term_ids = {}   # term name: term index
+        self.courses = []    # Course object for each row
+
+        g_student = []       # per (student, term) group: student index
+        g_term = []          #                            term index
+        r_group = []         # per row (course): group index
+        r_mark = []          #                   mark, -1 if ungraded
+        r_kind = []          #                   OTHER/HD/FAIL
+        kinds = {}           # grade name: kind, looked up once per distinct name
+
+        for si, zid in enumerate(self.zids):
+            for term, courses in students[zid].terms.items():
+                ti = self.term_ids.setdefault(term, len(self.term_ids))
+                gi = len(g_student)
+                g_student.append(si)
+                g_term.append(ti)
+                for course in courses:
+                    r_group.append(gi)
+                    r_mark.append(-1 if course.mark is None else course.mark)
+                    kind = kinds.get(course.grade_name)
+                    if kind is None:
+                        name = course.grade_name.upper()
+                        kind = kinds[course.grade_name] = HD if name == HD_GRADE else FAIL if name in FAIL_GRADES else OTHER
+                    r_kind.append(kind)
+                self.courses.extend(courses)
+
+        n_groups = len(g_student)
+        self.g_student = np.array(g_student, dtype=np.int64)
+        self.g_term = np.array(g_term, dtype=np.int64)
+        self.r_group = np.array(r_group, dtype=np.int64)
+        self.r_mark = np.array(r_mark, dtype=np.int64)
+        r_kind = np.array(r_kind, dtype=np.int8)
+        graded = self.r_mark >= 0
+
+        # per group sums
+        self.g_graded = np.bincount(self.r_group, weights=graded, minlength=n_groups)
+        g_total = np.bincount(self.r_group, weights=np.where(graded, self.r_mark, 0), minlength=n_groups)
+        self.g_subs = np.bincount(self.r_group, minlength=n_groups).astype(np.int64)
+        self.g_hd = np.bincount(self.r_group[r_kind == HD], minlength=n_groups).astype(np.int64)
+        self.g_fail = np.bincount(self.r_group[r_kind == FAIL], minlength=n_groups).astype(np.int64)
+
+        # term wams, rounded the same way as Student.calc_wam
+        means = np.divide(g_total, self.g_graded, out=np.zeros(n_groups), where=self.g_graded > 0)
+        self.g_wam = [round(m, 1) if n else None for (m, n) in zip(means.tolist(), self.g_graded.tolist())]
+        self.g_wam_arr = np.array([np.nan if w is None else w for w in self.g_wam], dtype=np.float64)
+
+        # group and row indices for each term, in student (then course) order
+        order = np.argsort(self.g_term, kind='stable')
+        bounds = np.searchsorted(self.g_term[order], np.arange(len(self.term_ids) + 1))
+        self.term_groups = [order[bounds[t]:bounds[t+1]] for t in range(len(self.term_ids))]
+        r_term = self.g_term[self.r_group]
+        order = np.argsort(r_term, kind='stable')
+        bounds = np.searchsorted(r_term[order], np.arange(len(self.term_ids) + 1))
+        self.term_rows = [order[bounds[t]:bounds[t+1]] for t in range(len(self.term_ids))]
+
+    # set wams and overall_wam on every student, as Student.process_wams does
+    def apply_wams(self):
+        terms = list(self.term_ids)
+        g_wam = self.g_wam
+        gi = 0
+        n_groups = len(g_wam)
+        g_student = self.g_student.tolist()
+        g_term = self.g_term.tolist()
+        for si, zid in enumerate(self.zids):
+            student = self.students[zid]
+            total = 0
+            while gi < n_groups and g_student[gi] == si:
+                w = g_wam[gi]
+                student.wams[terms[g_term[gi]]] = w
+                if w is not None:
+                    total += w
+                gi += 1
+            if student.wams:
+                student.overall_wam = round(total / sum(_ is not None for _ in student.wams), 1)
+
+    # same result as get_statistics(students, term): (college_stats, high_perf, under_perf)
+    def statistics(self, term):
+        ti = self.term_ids.get(term)
+        if ti is None:
+            return {'avg_wam': None}, {'top_wam': [('<None>', 0)], 'top_sub': [], 'full_hd': []}, {}
+
+        groups = self.term_groups[ti]
+        zids = self.zids
+        g_zid = [zids[s] for s in self.g_student[groups].tolist()]
+        wam = self.g_wam_arr[groups]
+        has_wam = ~np.isnan(wam)
+        wam0 = np.where(has_wam, wam, 0)
+
+        # average wam, summed in order as get_statistics does
+        wams = wam[has_wam]
+        college_stats = {'avg_wam': float(np.cumsum(wams)[-1]) / len(wams) if len(wams) else None}
+
+        # all students tied on the highest wam
+        if len(wams):
+            best = wams.max()
+            top_wam = [(g_zid[i], float(best)) for i in np.flatnonzero(has_wam & (wam == best)).tolist()]
+        else:
+            top_wam = [('<None>', 0)]
+
+        # students who held the top wam (so far) when get_statistics reached them
+        prev_best = np.concatenate(([0.0], np.maximum.accumulate(wam0)[:-1]))
+        was_top = has_wam & (wam0 >= prev_best)
+
+        # graded courses this term, and whether their student was a top wam at the time
+        rows = self.term_rows[ti]
+        rows = rows[self.r_mark[rows] >= 0]
+        pos = np.empty(len(self.g_wam), dtype=np.int64)
+        pos[groups] = np.arange(len(groups))
+        row_pos = pos[self.r_group[rows]]
+        row_top = was_top[row_pos]
+        marks = self.r_mark[rows]
+
+        # best subject: highest mark among students who weren't a top wam at the time
+        others = np.where(row_top, 0, marks)
+        best_mark = int(others.max()) if len(others) else 0
+        top_sub = []
+        if best_mark > 0:
+            for i in np.flatnonzero(~row_top & (marks == best_mark)).tolist():
+                top_sub.append(self._sub(g_zid[row_pos[i]], rows[i], best_mark))
+
+        # top wam's best subject: first highest mark that was at least the best subject so far
+        prev_mark = np.concatenate(([0], np.maximum.accumulate(others)[:-1]))[:len(others)]
+        eligible = row_top & (marks >= prev_mark)
+        if eligible.any():
+            mark = int(marks[eligible].max())
+            i = int(np.flatnonzero(eligible & (marks == mark))[0])
+            also_wam = self._sub(g_zid[row_pos[i]], rows[i], mark)
+            if any(also_wam[0] == zid for (zid, _) in top_wam):
+                top_sub.insert(0, also_wam)
+
+        # 2 or more HDs
+        hd = self.g_hd[groups]
+        subs = self.g_subs[groups]
+        full_hd = [(g_zid[i], int(hd[i]), int(subs[i])) for i in np.flatnonzero(hd >= 2).tolist()]
+
+        # failed a course or wam under 60
+        under = (self.g_fail[groups] > 0) | (has_wam & (wam0 < 60))
+        under_perf = {}
+        for i in np.flatnonzero(under).tolist():
+            under_perf[g_zid[i]] = self.students[g_zid[i]].terms[term]
+
+        high_perf = {'top_wam': top_wam, 'top_sub': top_sub, 'full_hd': full_hd}
+        return college_stats, high_perf, under_perf
+
+    def _sub(self, zid, row, mark):
+        course = self.courses[row]
+        return (zid, course.code + ' ' + course.name, mark)
+
+# engines for every college in college_data, with wams applied
+def build_engines(college_data):
+    engines = {}
+    for college, students in college_data.items():
+        engines[college] = WamEngine(students)
+        engines[college].apply_wams()
+    return engines